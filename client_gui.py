@@ -1,4 +1,5 @@
 import socket
+import struct
 import threading
 import tkinter as tk
 from tkinter import simpledialog, messagebox, scrolledtext
@@ -8,6 +9,10 @@ import base64
 import tempfile
 import time
 import datetime
+import atexit
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
 
 # Get the directory where this script is located
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -36,6 +41,13 @@ try:
 except ImportError:
     PIL_AVAILABLE = False
 
+# Optional fast JSON codec for the wire format
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
 # Import TCP Reno simulation
 try:
     from tcp_reno_simulator import (initialize_reno, simulate_reno_transmission, get_reno_stats, 
@@ -50,6 +62,42 @@ except ImportError:
 SERVER_HOST = '127.0.0.1'
 SERVER_PORT = 9999
 
+# Wire framing: 4-byte big-endian length followed by the JSON body (must match server.py).
+# Messages flagged 'binary' are followed by a second frame holding the raw file bytes.
+# Sent with REGISTER and LOGIN; the server refuses other versions.
+PROTOCOL_VERSION = 2
+HEADER = struct.Struct('>I')
+MAX_MESSAGE_SIZE = 1000000
+MAX_FILE_SIZE = 10 * 1024 * 1024
+
+def json_dumps_bytes(obj):
+    """Serialize a message to UTF-8 JSON bytes, using orjson when installed"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode('utf-8')
+
+def json_loads_bytes(data):
+    """Parse a UTF-8 JSON message body, using orjson when installed"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data.decode('utf-8'))
+
+# Debug output goes through a queue so the listener thread never blocks on file I/O.
+# Handlers are attached by start_logging(), so importing this module writes nothing.
+log = logging.getLogger('chat_client')
+log.setLevel(logging.DEBUG)
+log.propagate = False
+
+def start_logging():
+    """Write debug output to debug.log from a background listener thread"""
+    log_queue = queue.SimpleQueue()
+    file_handler = logging.FileHandler(os.path.join(SCRIPT_DIR, 'debug.log'), encoding='utf-8', delay=True)
+    file_handler.setFormatter(logging.Formatter('%(asctime)s [%(threadName)s] %(message)s'))
+    listener = QueueListener(log_queue, file_handler)
+    listener.start()
+    atexit.register(listener.stop)
+    log.addHandler(QueueHandler(log_queue))
+
 def send_json(sock, obj):
     """
     Send JSON data with RDT simulation and better error handling
@@ -65,12 +113,17 @@ def send_json(sock, obj):
         except socket.error:
             raise ConnectionError('Socket is not connected')
         
-        data = json.dumps(obj).encode('utf-8')
-        length = f'{len(data):08d}'.encode('utf-8')
-        
-        # Validate that we're sending a proper length header
-        if len(length) != 8:
-            raise ValueError(f"Length header must be 8 bytes, got {len(length)}")
+        blob = obj.get('data')
+        if isinstance(blob, (bytes, bytearray)):
+            # Raw file bytes travel in their own frame after the JSON metadata
+            meta = {k: v for k, v in obj.items() if k != 'data'}
+            meta['binary'] = True
+            meta['size'] = len(blob)
+            data = json_dumps_bytes(meta)
+        else:
+            blob = None
+            data = json_dumps_bytes(obj)
+        length = HEADER.pack(len(data))
         
         # RDT Simulation for message transmission
         if RDT_AVAILABLE:
@@ -85,11 +138,13 @@ def send_json(sock, obj):
             elif obj.get('type') == 'PRIVATE_MESSAGE':
                 data_type = "private_message"
             
-            # TCP Reno simulation (no delays)
-            simulate_reno_transmission(obj, data_type)
+            # TCP Reno simulation (no delays); size it by the bytes actually sent
+            simulate_reno_transmission(data if blob is None else blob, data_type)
             
         # Send all data at once to avoid partial sends
         full_message = length + data
+        if blob is not None:
+            full_message += HEADER.pack(len(blob)) + blob
         sock.sendall(full_message)
         
         # Update last activity time for connection monitoring
@@ -110,79 +165,48 @@ def send_json(sock, obj):
     except Exception as e:
         raise ConnectionError(f'Error preparing message: {e}')
 
-def recv_full(sock, length):
-    data = b''
-    while len(data) < length:
+def recv_full(sock, length, what='data'):
+    """Receive exactly length bytes into a preallocated buffer"""
+    buf = bytearray(length)
+    view = memoryview(buf)
+    received = 0
+    while received < length:
         try:
-            more = sock.recv(length - len(data))
-            if not more:
+            n = sock.recv_into(view[received:])
+            if not n:
                 raise ConnectionError('Socket closed')
-            data += more
+            received += n
         except socket.timeout:
-            raise ConnectionError('Socket timeout while reading data')
+            raise ConnectionError(f'Socket timeout while reading {what}')
         except socket.error as e:
-            raise ConnectionError(f'Socket error while reading data: {e}')
-    return data
+            raise ConnectionError(f'Socket error while reading {what}: {e}')
+    return buf
 
 def recv_json(sock):
     """
-    Receive JSON data with improved error handling and protocol recovery
+    Receive JSON data with improved error handling
     """
-    length_bytes = b''
-    while len(length_bytes) < 8:
-        try:
-            more = sock.recv(8 - len(length_bytes))
-            if not more:
-                raise ConnectionError('Socket closed')
-            length_bytes += more
-        except socket.timeout:
-            raise ConnectionError('Socket timeout while reading length')
-        except socket.error as e:
-            raise ConnectionError(f'Socket error while reading length: {e}')
-    
-    try:
-        # Decode and convert to integer with error handling
-        length_str = length_bytes.decode('utf-8')
-        
-        # Enhanced debugging - always show problematic data
-        if not length_str.isdigit() or len(length_str) != 8:
-            print(f"[PROTOCOL ERROR] Invalid length received:")
-            print(f"  Raw bytes: {repr(length_bytes)}")
-            print(f"  Decoded string: {repr(length_str)}")
-            print(f"  Length: {len(length_str)}")
-            print(f"  Is digit: {length_str.isdigit()}")
-            
-            # Try to recover by looking for a valid length pattern
-            if len(length_bytes) >= 8:
-                # Check if we can find a valid 8-digit pattern
-                for i in range(len(length_bytes) - 7):
-                    test_bytes = length_bytes[i:i+8]
-                    try:
-                        test_str = test_bytes.decode('utf-8')
-                        if test_str.isdigit() and len(test_str) == 8:
-                            print(f"[RECOVERY] Found valid length pattern at offset {i}: {test_str}")
-                            # Would need to adjust the stream here, but this is complex
-                            break
-                    except:
-                        continue
-            
-            raise ValueError(f"Invalid length format: {repr(length_str)} (expected 8 digits)")
-        
-        length = int(length_str)
-        if length < 0 or length > 1000000:  # Reasonable size limit
-            raise ValueError(f"Invalid message length: {length}")
-            
-    except (UnicodeDecodeError, ValueError) as e:
-        raise ConnectionError(f'Invalid message length received: {repr(length_bytes)} - {e}')
+    length_bytes = recv_full(sock, HEADER.size, 'length')
+    length = HEADER.unpack(length_bytes)[0]
+    if length > MAX_MESSAGE_SIZE:  # Reasonable size limit
+        log.debug("Invalid length received: raw=%r length=%d", length_bytes, length)
+        raise ConnectionError(f'Invalid message length received: {length}')
     
     data = recv_full(sock, length)
     try:
-        return json.loads(data.decode('utf-8'))
+        message = json_loads_bytes(data)
     except (json.JSONDecodeError, UnicodeDecodeError) as e:
-        print(f"[JSON ERROR] Failed to parse JSON:")
-        print(f"  Data length: {len(data)}")
-        print(f"  First 100 bytes: {repr(data[:100])}")
+        log.debug("Failed to parse JSON: length=%d first100=%r", len(data), data[:100])
         raise ConnectionError(f'Invalid JSON data received: {repr(data[:100])}... - {e}')
+    
+    if message.get('binary'):
+        del message['binary']
+        size = HEADER.unpack(recv_full(sock, HEADER.size, 'length'))[0]
+        if size != message.pop('size') or size > MAX_FILE_SIZE:
+            raise ConnectionError(f'Invalid file length received: {size}')
+        # The UI and chat history keep file contents base64-encoded
+        message['data'] = base64.b64encode(recv_full(sock, size, 'file data')).decode('ascii')
+    return message
 
 class FriendManager:
     def __init__(self, username):
@@ -229,6 +253,11 @@ class FriendManager:
         else:
             print(f"[FRIEND_MANAGER] {friend} already in {self.username}'s friend list")
 
+    def replace_all(self, friends):
+        """Replace the friend list with the server's copy and save it"""
+        self.friends = set(friends)
+        self.save()
+
     def remove(self, friend):
         if friend in self.friends:
             self.friends.remove(friend)
@@ -253,6 +282,9 @@ class ChatClient:
             self.red_dot_img = ImageTk.PhotoImage(Image.open("red_dot.png").resize((14, 14)))
         except Exception:
             self.green_dot_img = self.red_dot_img = None
+    def request_friend_list(self):
+        """Ask the server for our friend list; it is authoritative over the local file"""
+        send_json(self.sock, {'type': 'GET_FRIEND_LIST', 'username': self.username})
     def refresh_status(self):
         if self.connected and self.friend_manager:
             friends = self.friend_manager.get_all()
@@ -272,6 +304,8 @@ class ChatClient:
         self.notifications_home = {}  # Initialize notifications_home early
         self.find_friend_window = None
         self.current_chat = None  # (type, name) where type is 'private' or 'group'
+        self.info_content_frame = None
+        self.notification_listbox = None
         
         # Connection monitoring
         self.last_activity = time.time()
@@ -283,7 +317,7 @@ class ChatClient:
         self.clear_window()
         self.login_mode = True  # True for login, False for register
         # Ensure previous socket is closed and listener thread is stopped
-        if hasattr(self, 'listener_thread') and self.listener_thread and self.listener_thread.is_alive():
+        if self.listener_thread is not None and self.listener_thread.is_alive():
             self.connected = False  # Signal thread to exit
             try:
                 if self.sock:
@@ -361,10 +395,11 @@ class ChatClient:
             self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             # Set socket options for better reliability
             self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
             # Set timeout to prevent hanging
             self.sock.settimeout(30.0)
             self.sock.connect((SERVER_HOST, SERVER_PORT))
-            send_json(self.sock, {'type': 'REGISTER', 'data': self.info})
+            send_json(self.sock, {'type': 'REGISTER', 'version': PROTOCOL_VERSION, 'data': self.info})
             resp = recv_json(self.sock)
             if resp.get('type') == 'REGISTER_SUCCESS':
                 self.connected = True
@@ -401,10 +436,11 @@ class ChatClient:
             self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             # Set socket options for better reliability
             self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
             # Set timeout to prevent hanging
             self.sock.settimeout(30.0)
             self.sock.connect((SERVER_HOST, SERVER_PORT))
-            send_json(self.sock, {'type': 'LOGIN', 'name': name, 'password': password})
+            send_json(self.sock, {'type': 'LOGIN', 'version': PROTOCOL_VERSION, 'name': name, 'password': password})
             resp = recv_json(self.sock)
             if resp.get('type') == 'LOGIN_SUCCESS':
                 self.connected = True
@@ -439,11 +475,13 @@ class ChatClient:
                 self.refresh_friendlist()
                 self.listener_thread = threading.Thread(target=self.listen_server, daemon=True)
                 self.listener_thread.start()
+                # Pick up friendship changes made while we were offline
+                self.request_friend_list()
                 
                 # Start connection monitoring
                 self.start_connection_monitoring()
             else:
-                messagebox.showerror('Error', resp.get('reason', 'Login failed!'))
+                messagebox.showerror('Error', resp.get('reason') or resp.get('message', 'Login failed!'))
         except Exception as e:
             messagebox.showerror('Error', f'Could not connect: {e}')
 
@@ -474,19 +512,20 @@ class ChatClient:
             # Create new socket
             self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
             self.sock.settimeout(30.0)
             self.sock.connect((SERVER_HOST, SERVER_PORT))
             
             # Try to login again with stored credentials
             if hasattr(self, 'stored_password'):
-                send_json(self.sock, {'type': 'LOGIN', 'name': self.username, 'password': self.stored_password})
+                send_json(self.sock, {'type': 'LOGIN', 'version': PROTOCOL_VERSION, 'name': self.username, 'password': self.stored_password})
                 resp = recv_json(self.sock)
                 if resp.get('type') == 'LOGIN_SUCCESS':
                     self.connected = True
                     self.sock.settimeout(None)
                     
                     # Restart listener thread
-                    if hasattr(self, 'listener_thread') and self.listener_thread and self.listener_thread.is_alive():
+                    if self.listener_thread is not None and self.listener_thread.is_alive():
                         self.connected = False
                         self.listener_thread.join(timeout=1)
                     
@@ -521,8 +560,7 @@ class ChatClient:
                         if self.attempt_reconnection():
                             print("[MONITOR] Successfully reconnected")
                             # Restart listener thread if needed
-                            if not (hasattr(self, 'listener_thread') and 
-                                   self.listener_thread and self.listener_thread.is_alive()):
+                            if self.listener_thread is None or not self.listener_thread.is_alive():
                                 self.listener_thread = threading.Thread(target=self.listen_server, daemon=True)
                                 self.listener_thread.start()
                         else:
@@ -651,9 +689,6 @@ class ChatClient:
         self.notification_listbox.bind('<Double-Button-1>', self.handle_notification_click)
         # Clear any existing notifications when building main interface
         self.notification_listbox.delete(0, tk.END)
-        # Only initialize if not already set
-        if not hasattr(self, 'notifications_home'):
-            self.notifications_home = {}  # sender -> message
 
         # Joined Groups List
         tk.Label(
@@ -1292,7 +1327,7 @@ class ChatClient:
             current_time = datetime.datetime.now()
             timestamp = current_time.isoformat()
             
-            msg = {'type': 'GROUP_MEDIA', 'group_name': group_name, 'from': self.username, 'filename': filename, 'data': encoded, 'timestamp': timestamp}
+            msg = {'type': 'GROUP_MEDIA', 'group_name': group_name, 'from': self.username, 'filename': filename, 'data': data, 'timestamp': timestamp}
             
             # Verify connection before sending
             if not self.check_connection():
@@ -1371,7 +1406,7 @@ class ChatClient:
             current_time = datetime.datetime.now()
             timestamp = current_time.isoformat()
             
-            msg = {'type': 'MEDIA', 'to': to_user, 'from': self.username, 'filename': filename, 'data': encoded, 'timestamp': timestamp}
+            msg = {'type': 'MEDIA', 'to': to_user, 'from': self.username, 'filename': filename, 'data': data, 'timestamp': timestamp}
             
             # Verify connection before sending
             if not self.check_connection():
@@ -1431,7 +1466,7 @@ class ChatClient:
 
     def request_user_list(self):
         if self.connected:
-            send_json(self.sock, {'type': 'LIST'})
+            send_json(self.sock, {'type': 'LIST_REQUEST'})
             # Do not call refresh_friendlist here; wait for LIST_RESPONSE from server
 
     def find_friend(self):
@@ -2314,19 +2349,8 @@ class ChatClient:
         cancel_btn.pack(side=tk.RIGHT)
         
         # Add button hover effects
-        def on_leave_enter(e):
-            leave_btn.config(bg='#C82333')
-        def on_leave_leave(e):
-            leave_btn.config(bg='#DC3545')
-        def on_cancel_enter(e):
-            cancel_btn.config(bg='#5A6268')
-        def on_cancel_leave(e):
-            cancel_btn.config(bg='#6C757D')
-            
-        leave_btn.bind('<Enter>', on_leave_enter)
-        leave_btn.bind('<Leave>', on_leave_leave)
-        cancel_btn.bind('<Enter>', on_cancel_enter)
-        cancel_btn.bind('<Leave>', on_cancel_leave)
+        self._bind_hover(leave_btn, '#C82333', '#DC3545')
+        self._bind_hover(cancel_btn, '#5A6268', '#6C757D')
         
         # Handle window close (treat as cancel)
         leave_win.protocol("WM_DELETE_WINDOW", cancel_leave)
@@ -2431,6 +2455,7 @@ class ChatClient:
             # Create new socket with proper configuration
             self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
             self.sock.settimeout(30.0)
             
             # Attempt connection
@@ -2438,13 +2463,14 @@ class ChatClient:
             
             # Re-login using stored credentials
             if hasattr(self, 'username') and hasattr(self, 'stored_password'):
-                send_json(self.sock, {'type': 'LOGIN', 'name': self.username, 'password': self.stored_password})
+                send_json(self.sock, {'type': 'LOGIN', 'version': PROTOCOL_VERSION, 'name': self.username, 'password': self.stored_password})
                 resp = recv_json(self.sock)
                 
                 if resp.get('type') == 'LOGIN_SUCCESS':
                     print("[RECONNECT] Successfully reconnected!")
                     self.connected = True
                     self.sock.settimeout(None)  # Remove timeout for listening
+                    self.request_friend_list()
                     return True
                 else:
                     print(f"[RECONNECT] Login failed after reconnection: {resp.get('reason', 'Unknown error')}")
@@ -2479,6 +2505,9 @@ class ChatClient:
                     if mtype == 'LIST_RESPONSE':
                         self.active_users = message['users']
                         self.refresh_friendlist(self.active_users)
+                    elif mtype == 'FRIEND_LIST_RESPONSE':
+                        self.friend_manager.replace_all(message.get('friends', []))
+                        self.refresh_friendlist()
                     elif mtype == 'FRIEND_REQUEST':
                         from_user = message.get('from')
                         sender_info = message.get('sender_info', {})
@@ -2579,7 +2608,10 @@ class ChatClient:
                         filename = message['filename']
                         filedata = message['data']
                         timestamp = message.get('timestamp', datetime.datetime.now().isoformat())
-                        if self.current_chat and self.current_chat[0] == 'private' and self.current_chat[1] == sender:
+                        if message.get('offline'):
+                            # Files queued while we were away arrive one per frame, outside OFFLINE_MESSAGES
+                            self.add_home_notification(sender, f'Sent a file: {filename}', is_file=True, filedata=filedata, filename=filename, timestamp=timestamp, is_offline_message=True)
+                        elif self.current_chat and self.current_chat[0] == 'private' and self.current_chat[1] == sender:
                             self.display_file_in_main(sender, filename, filedata, align='left', timestamp=timestamp)
                             users = sorted([self.username, sender])
                             history_file = f"chat_{users[0]}_{users[1]}.json"
@@ -2598,12 +2630,12 @@ class ChatClient:
                         # Display in main chat if currently viewing this group
                         if (self.current_chat and self.current_chat[0] == 'group' and 
                             self.current_chat[1] == gname):
-                            print(f"DEBUG: Displaying group message in main chat for group {gname}")
+                            log.debug("Displaying group message in main chat for group %s", gname)
                             self.display_message_in_main(f'{sender} (Group {gname})', msg, align='left', timestamp=timestamp)
                         else:
                             # Add as notification if not viewing this group
-                            print(f"DEBUG: Current chat: {self.current_chat}")
-                            print(f"DEBUG: Adding group message notification from {sender} for group {gname}")
+                            log.debug("Current chat: %s", self.current_chat)
+                            log.debug("Adding group message notification from %s for group %s", sender, gname)
                             # Format message to trigger group message detection
                             group_msg_text = f'(Group {gname}) {msg}'
                             self.add_home_notification(sender, group_msg_text, timestamp=timestamp)
@@ -2616,19 +2648,19 @@ class ChatClient:
                         
                         self.add_joined_group(gname)
                     elif mtype == 'GROUP_INVITE':
-                        print(f"DEBUG: Received GROUP_INVITE message: {message}")
+                        log.debug("Received GROUP_INVITE message: %s", message)
                         group_name = message.get('group_name')
                         from_user = message.get('from')
                         sender_info = message.get('sender_info', {})
-                        print(f"DEBUG: group_name={group_name}, from_user={from_user}, sender_info={sender_info}")
+                        log.debug("group_name=%s, from_user=%s, sender_info=%s", group_name, from_user, sender_info)
                         
                         if group_name and from_user:
                             # Add group invitation to notifications instead of showing dialog directly
-                            print(f"DEBUG: Adding group invitation notification for {group_name} from {from_user}")
+                            log.debug("Adding group invitation notification for %s from %s", group_name, from_user)
                             self.add_home_notification(from_user, f"invited you to join group '{group_name}'", 
                                                      is_group_invite=True, group_name=group_name, sender_info=sender_info)
                         else:
-                            print(f"DEBUG: Missing group_name or from_user in GROUP_INVITE message")
+                            log.debug("Missing group_name or from_user in GROUP_INVITE message")
                     elif mtype == 'GROUP_MEDIA':
                         sender = message['from']
                         filename = message['filename']
@@ -2666,10 +2698,19 @@ class ChatClient:
                                 if group_name:
                                     self.add_home_notification(sender, f"invited you to join group '{group_name}'", 
                                                              is_group_invite=True, group_name=group_name, sender_info=sender_info, timestamp=timestamp, is_offline_message=True)
-                            elif msg.get('is_file'):
-                                self.add_home_notification(sender, f"Sent a file: {msg.get('filename')}", is_file=True, filedata=msg.get('data'), filename=msg.get('filename'), timestamp=timestamp, is_offline_message=True)
+                            elif msg.get('type') == 'FRIEND_REQUEST_ACCEPTED':
+                                self.friend_manager.add(sender)
+                                self.refresh_friendlist()
+                                self.add_home_notification(sender, 'accepted your friend request', timestamp=timestamp, is_offline_message=True)
+                            elif msg.get('type') == 'UNFRIENDED_BY':
+                                self.friend_manager.remove(sender)
+                                self.refresh_friendlist()
+                                self.add_home_notification(sender, 'removed you from their friends list', timestamp=timestamp, is_offline_message=True)
                             else:
                                 self.add_home_notification(sender, msg.get('msg', ''), timestamp=timestamp, is_offline_message=True)
+                    elif mtype == 'ERROR':
+                        # Protocol-level rejection of something we sent; nothing to show the user
+                        log.debug("Server error reply: %s", message.get('message'))
                     elif mtype == 'MESSAGE_ERROR':
                         reason = message.get('reason', 'Message sending failed')
                         messagebox.showerror('Message Error', reason)
@@ -2700,27 +2741,27 @@ class ChatClient:
                         messagebox.showerror('Leave Group Error', error_msg)
                     elif mtype == 'UNFRIEND_SUCCESS':
                         unfriended_user = message.get('unfriended_user')
-                        print(f"[DEBUG] Received UNFRIEND_SUCCESS for {unfriended_user}")
+                        log.debug("Received UNFRIEND_SUCCESS for %s", unfriended_user)
                         if unfriended_user:
                             # Refresh friend list to update UI (friendship already removed locally)
                             self.refresh_friendlist()
-                            print(f"[DEBUG] Refreshed friend list after unfriend success")
+                            log.debug("Refreshed friend list after unfriend success")
                             # The success message is already shown in unfriend_user method
                     elif mtype == 'UNFRIEND_ERROR':
                         error_msg = message.get('message', 'Failed to unfriend user')
-                        print(f"[DEBUG] Received UNFRIEND_ERROR: {error_msg}")
+                        log.debug("Received UNFRIEND_ERROR: %s", error_msg)
                         messagebox.showerror('Unfriend Error', error_msg)
                     elif mtype == 'UNFRIENDED_BY':
                         unfriended_by = message.get('unfriended_by')
-                        print(f"[DEBUG] Received UNFRIENDED_BY from {unfriended_by}")
+                        log.debug("Received UNFRIENDED_BY from %s", unfriended_by)
                         if unfriended_by:
                             # Remove from local friend list
                             removed = self.friend_manager.remove(unfriended_by)
-                            print(f"[DEBUG] Removed {unfriended_by} from local friend list: {removed}")
+                            log.debug("Removed %s from local friend list: %s", unfriended_by, removed)
                             
                             # Refresh friend list to update UI
                             self.refresh_friendlist()
-                            print(f"[DEBUG] Refreshed friend list after being unfriended")
+                            log.debug("Refreshed friend list after being unfriended")
                             
                             # Show notification
                             messagebox.showinfo('Unfriended', 
@@ -2736,7 +2777,7 @@ class ChatClient:
                                 self.chat_area.delete(1.0, tk.END)
                                 self.chat_area.insert(tk.END, 'Select a friend or group to start chatting.\n')
                                 self.chat_area.config(state='disabled')
-                                print(f"[DEBUG] Closed chat with unfriended user {unfriended_by}")
+                                log.debug("Closed chat with unfriended user %s", unfriended_by)
                 except ConnectionError as e:
                     # Connection specific errors - likely network issues
                     consecutive_errors += 1
@@ -2787,7 +2828,7 @@ class ChatClient:
 
     def add_home_notification(self, sender, msg, is_file=False, filedata=None, filename=None, is_friend_request=False, sender_info=None, is_group_invite=False, group_name=None, timestamp=None, is_offline_message=False):
         # Only one notification per sender (but allow friend requests, group invites, group messages, and offline messages to override regular messages)
-        if not hasattr(self, 'notification_listbox'):
+        if self.notification_listbox is None:
             print(f"[ERROR] No notification_listbox found!")
             return
         
@@ -3818,7 +3859,7 @@ class ChatClient:
         # Mark as disconnected and reset UI, but do NOT close the socket
         self.connected = False
         # Reset info section
-        if hasattr(self, 'info_content_frame'):
+        if self.info_content_frame is not None:
             self.reset_info_section()
         # Optionally, notify server of logout (if protocol supports it)
         try:
@@ -3826,7 +3867,7 @@ class ChatClient:
         except Exception:
             pass
         # Wait for listener thread to exit
-        if hasattr(self, 'listener_thread') and self.listener_thread and self.listener_thread.is_alive():
+        if self.listener_thread is not None and self.listener_thread.is_alive():
             try:
                 self.sock.shutdown(socket.SHUT_RDWR)
             except Exception:
@@ -3842,6 +3883,17 @@ class ChatClient:
         self.group_name = None
         self.build_login()
 
+    @staticmethod
+    def _hover(widget, color):
+        """Set a button background on hover enter/leave"""
+        widget.config(bg=color)
+
+    @staticmethod
+    def _bind_hover(widget, hover_color, normal_color):
+        """Bind enter/leave hover colors to a button"""
+        widget.bind('<Enter>', lambda e, w=widget: ChatClient._hover(w, hover_color))
+        widget.bind('<Leave>', lambda e, w=widget: ChatClient._hover(w, normal_color))
+
     def show_friend_request_dialog(self, sender, sender_info):
         """Show detailed friend request dialog with user information"""
         print(f"[FRIEND REQUEST DIALOG] ===== OPENING DIALOG =====")
@@ -4000,19 +4052,8 @@ class ChatClient:
         ignore_btn.pack(side=tk.RIGHT, padx=30)
         
         # Add button hover effects
-        def on_accept_enter(e):
-            accept_btn.config(bg='#218838')
-        def on_accept_leave(e):
-            accept_btn.config(bg='#28A745')
-        def on_ignore_enter(e):
-            ignore_btn.config(bg='#C82333')
-        def on_ignore_leave(e):
-            ignore_btn.config(bg='#DC3545')
-            
-        accept_btn.bind('<Enter>', on_accept_enter)
-        accept_btn.bind('<Leave>', on_accept_leave)
-        ignore_btn.bind('<Enter>', on_ignore_enter)
-        ignore_btn.bind('<Leave>', on_ignore_leave)
+        self._bind_hover(accept_btn, '#218838', '#28A745')
+        self._bind_hover(ignore_btn, '#C82333', '#DC3545')
         
         # Handle window close (treat as ignore)
         dialog.protocol("WM_DELETE_WINDOW", ignore_request)
@@ -4167,19 +4208,8 @@ class ChatClient:
         decline_btn.pack(side=tk.RIGHT, padx=30)
         
         # Add button hover effects
-        def on_accept_enter(e):
-            accept_btn.config(bg='#218838')
-        def on_accept_leave(e):
-            accept_btn.config(bg='#28A745')
-        def on_decline_enter(e):
-            decline_btn.config(bg='#C82333')
-        def on_decline_leave(e):
-            decline_btn.config(bg='#DC3545')
-            
-        accept_btn.bind('<Enter>', on_accept_enter)
-        accept_btn.bind('<Leave>', on_accept_leave)
-        decline_btn.bind('<Enter>', on_decline_enter)
-        decline_btn.bind('<Leave>', on_decline_leave)
+        self._bind_hover(accept_btn, '#218838', '#28A745')
+        self._bind_hover(decline_btn, '#C82333', '#DC3545')
         
         # Handle window close (treat as decline)
         dialog.protocol("WM_DELETE_WINDOW", decline_invitation)
@@ -4191,7 +4221,7 @@ class ChatClient:
 
     def remove_notification(self, sender):
         """Remove notification from the notification list"""
-        if not hasattr(self, 'notification_listbox'):
+        if self.notification_listbox is None:
             return
             
         # Find and remove the notification (iterate backwards to avoid index issues)
@@ -4210,6 +4240,7 @@ class ChatClient:
     # ...existing code...
 
 if __name__ == '__main__':
+    start_logging()
     root = tk.Tk()
     app = ChatClient(root)
     root.mainloop()
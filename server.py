@@ -1,367 +1,820 @@
 import socket
+import struct
+import base64
 import threading
 import json
 import os
 import time
 import datetime
 import hashlib
-from typing import Dict, List, Set
+import hmac
+import atexit
+import glob
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from urllib.parse import quote, unquote
+from typing import Dict, Set
+
+# Optional fast JSON codecs: orjson, then ujson, then the standard library
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import ujson
+    UJSON_AVAILABLE = True
+except ImportError:
+    UJSON_AVAILABLE = False
 
 # Server configuration
 HOST = '127.0.0.1'
 PORT = 9999
+SAVE_INTERVAL = 1.0  # seconds between background flushes of dirty data
+
+# Wire framing: 4-byte big-endian length followed by the JSON body.
+# Messages flagged 'binary' are followed by a second frame holding the raw file bytes.
+# Clients send PROTOCOL_VERSION with REGISTER and LOGIN; other versions are refused.
+PROTOCOL_VERSION = 2
+HEADER = struct.Struct('>I')
+MAX_FILE_SIZE = 10 * 1024 * 1024
+MAX_MESSAGE_SIZE = 1000000  # JSON bodies only; file bytes travel in the binary frame
+SENDMSG_AVAILABLE = hasattr(socket.socket, 'sendmsg')  # not available on Windows
+
+SOCKET_BUFFER_SIZE = 1 << 20  # per-connection send/receive buffer
+RECV_BUFFER_SIZE = 64 * 1024  # per-connection read-ahead; pipelined messages cost one recv
+RECV_POOL_SIZE = 4096  # messages up to this size are read into a reused per-thread buffer
+SEND_TIMEOUT = 5.0  # seconds a send to one client may block before it is dropped
+BROADCAST_WORKERS = 32  # threads used to fan group frames out to members
+MAX_CLIENTS = 512  # client handler threads; further connections are refused
+LOGIN_TIMEOUT = 30.0  # seconds a connection may sit idle before logging in
+LISTEN_BACKLOG = 1024
+
+# Per-user offline queue limits; the oldest messages are dropped first
+OFFLINE_MAX_MESSAGES = 1000
+OFFLINE_MAX_BYTES = 50 * 1024 * 1024
+OFFLINE_DIR = 'data/offline'  # one append-only JSON-lines log per user
+
+PBKDF2_ITERATIONS = 200000
+PRIVATE_USER_FIELDS = ('password', 'salt', 'pwhash')
+
+# Fields each message type must carry; checked once before dispatch
+REQUIRED_FIELDS = {
+    'REGISTER': ('data',),
+    'LOGIN': ('name', 'password'),
+    'FRIEND_REQUEST': ('from', 'to'),
+    'FRIEND_REQUEST_RESPONSE': ('from', 'to', 'accepted'),
+    'PRIVATE_MESSAGE': ('from', 'to', 'msg'),
+    'GROUP_MESSAGE': ('from', 'group_name', 'msg'),
+    'MEDIA': ('from', 'to', 'filename', 'data'),
+    'GROUP_MEDIA': ('from', 'group_name', 'filename', 'data'),
+    'CREATE_GROUP': ('group_name', 'creator'),
+    'GROUP_INVITE': ('from', 'to', 'group_name'),
+    'GROUP_INVITE_RESPONSE': ('from', 'group_name', 'accepted'),
+    'JOIN_GROUP': ('group_name', 'user'),
+    'LEAVE_GROUP': ('group_name', 'user'),
+    'UNFRIEND': ('from', 'target'),
+    'GET_FRIEND_LIST': ('username',),
+    'EDIT_PROFILE': ('name', 'new_info'),
+}
+
+# Logging goes through a queue so formatting and stdout writes happen on the
+# listener thread. Per-message traces are DEBUG and off by default.
+LOG_LEVEL = logging.DEBUG if os.environ.get('CHAT_DEBUG') else logging.INFO
+
+logger = logging.getLogger('chat_server')
+logger.setLevel(LOG_LEVEL)
+logger.propagate = False
+_log_queue = queue.SimpleQueue()
+logger.addHandler(QueueHandler(_log_queue))
+_log_stream = logging.StreamHandler()
+_log_stream.setFormatter(logging.Formatter('[SERVER] %(message)s'))
+_log_listener = QueueListener(_log_queue, _log_stream)
+_log_listener.start()
+atexit.register(_log_listener.stop)
+
+def json_dumps_bytes(obj):
+    """Serialize obj to compact UTF-8 JSON bytes with the fastest available codec"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj)
+    if UJSON_AVAILABLE:
+        return ujson.dumps(obj, ensure_ascii=False).encode('utf-8')
+    return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+def json_loads_bytes(data):
+    """Parse UTF-8 JSON bytes with the fastest available codec"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    if UJSON_AVAILABLE:
+        return ujson.loads(bytes(data))
+    return json.loads(str(data, 'utf-8'))
+
+def frame_json(obj):
+    """Length-prefixed frame for a message without binary data"""
+    data = json_dumps_bytes(obj)
+    return [HEADER.pack(len(data)) + data]
+
+@lru_cache(maxsize=None)
+def error_frame(msg_type, text):
+    """Frame for a fixed error reply, encoded once and reused"""
+    return tuple(frame_json({'type': msg_type, 'message': text}))
+
+PONG_FRAME = tuple(frame_json({'type': 'PONG'}))
+
+def hash_password(password, salt=None):
+    """Return the salt and PBKDF2 hash fields stored for a password"""
+    if salt is None:
+        salt = os.urandom(16)
+    pwhash = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, PBKDF2_ITERATIONS)
+    return {'salt': salt.hex(), 'pwhash': pwhash.hex()}
+
+def verify_password(record, password):
+    """Check a password against a user record in constant time"""
+    if 'pwhash' in record:
+        expected = hash_password(password, bytes.fromhex(record['salt']))['pwhash']
+        return hmac.compare_digest(expected, record['pwhash'])
+    # Legacy record with a plaintext password
+    return hmac.compare_digest(str(record.get('password', '')).encode('utf-8'), password.encode('utf-8'))
+
+def public_user_info(record):
+    """User record without credential fields, safe to send to clients"""
+    return {k: v for k, v in record.items() if k not in PRIVATE_USER_FIELDS}
+
+def offline_message_size(message):
+    """Approximate stored size of an offline message (text plus file data)"""
+    return len(message.get('data') or '') + len(message.get('msg') or '')
+
+def set_send_timeout(sock, seconds):
+    """Bound how long a blocking send may wait without affecting receives"""
+    if os.name == 'nt':
+        value = struct.pack('<L', int(seconds * 1000))
+    else:
+        value = struct.pack('ll', int(seconds), int(seconds % 1 * 1000000))
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDTIMEO, value)
+
+def offline_log_path(username):
+    """Path of a user's offline message log; the name is quoted to stay inside OFFLINE_DIR"""
+    return os.path.join(OFFLINE_DIR, quote(username, safe='') + '.jsonl')
+
+def load_json_file(path):
+    """Read and parse a JSON file"""
+    with open(path, 'rb') as f:
+        return json_loads_bytes(f.read())
+
+def write_file_atomic(path, data):
+    """Atomically replace a file with already encoded bytes"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
 
 class ChatServer:
     def __init__(self):
         self.clients: Dict[str, socket.socket] = {}  # username -> socket
         self.users_db = {}  # user database
         self.groups_db = {}  # group database
-        self.offline_messages = {}  # username -> list of messages
+        self.offline_messages = {}  # username -> deque of messages
+        self.offline_bytes = {}  # username -> approximate queued size
+        self.offline_lock = threading.Lock()  # guards the offline queues and their log files
         self.friend_requests = {}  # pending friend requests
+        self.friends_cache: Dict[str, Set[str]] = {}  # username -> friend set
+        self.user_to_groups: Dict[str, Set[str]] = {}  # username -> group names
         self.lock = threading.Lock()
+        self.send_locks: Dict[socket.socket, threading.Lock] = {}  # keeps frames from interleaving
+        self._recv_local = threading.local()  # per-thread buffer for small incoming messages
+        
+        # Encoded LIST/ALL_USERS replies, rebuilt only after the data they show changes
+        self.presence_version = 0  # bumped on login and disconnect
+        self.users_version = 0  # bumped when a user record changes
+        self._reply_cache = {}  # message type -> (version, frame)
+        self._sender_info_cache = (0, {})  # (users_version, username -> public profile)
+        self.broadcast_pool = ThreadPoolExecutor(max_workers=BROADCAST_WORKERS, thread_name_prefix='broadcast')
+        self.client_pool = ThreadPoolExecutor(max_workers=MAX_CLIENTS, thread_name_prefix='client')
+        self.connections: Set[socket.socket] = set()  # every open client socket, logged in or not
+        self.client_slots = threading.BoundedSemaphore(MAX_CLIENTS)  # one per running handler
+        
+        # Background persistence: handlers mark data dirty, the flusher writes it
+        self._pending_saves = set()  # 'users', 'groups', 'friends'
+        self._save_lock = threading.Lock()
+        self._save_event = threading.Event()
         
         # Ensure data directory exists
         os.makedirs('data', exist_ok=True)
+        os.makedirs(OFFLINE_DIR, exist_ok=True)
         
         # Load existing data
         self.load_users()
         self.load_groups()
         self.load_offline_messages()
+        self.load_all_friends()
         
-        print("[SERVER] Chat Server initialized")
+        # Message type -> handler(client_socket, message)
+        self.handlers = {
+            'LIST_REQUEST': self.handle_list_request,
+            'STATUS': self.handle_status,
+            'GET_ALL_USERS': self.handle_get_all_users,
+            'FRIEND_REQUEST': self.handle_friend_request,
+            'FRIEND_REQUEST_RESPONSE': self.handle_friend_request_response,
+            'PRIVATE_MESSAGE': self.handle_private_message,
+            'GROUP_MESSAGE': self.handle_group_message,
+            'MEDIA': self.handle_media_message,
+            'GROUP_MEDIA': self.handle_group_media,
+            'CREATE_GROUP': self.handle_create_group,
+            'GROUP_INVITE': self.handle_group_invite,
+            'GROUP_INVITE_RESPONSE': self.handle_group_invite_response,
+            'JOIN_GROUP': self.handle_join_group,
+            'LEAVE_GROUP': self.handle_leave_group,
+            'UNFRIEND': self.handle_unfriend,
+            'GET_FRIEND_LIST': self.handle_get_friend_list,
+            'EDIT_PROFILE': self.handle_edit_profile,
+            'PING': self.handle_ping,
+        }
+        
+        threading.Thread(target=self._save_loop, daemon=True).start()
+        atexit.register(self.flush_saves)
+        
+        logger.info("Chat Server initialized")
+
+    def schedule_save(self, *keys):
+        """Mark data as dirty so the background flusher persists it"""
+        with self._save_lock:
+            self._pending_saves.update(keys)
+        self._save_event.set()
+
+    def flush_saves(self):
+        """Write all dirty data to disk"""
+        with self._save_lock:
+            pending = self._pending_saves
+            self._pending_saves = set()
+        # Each save snapshots its data under self.lock and writes the file outside it
+        for key in pending:
+            if key == 'users':
+                self.save_users()
+            elif key == 'groups':
+                self.save_groups()
+            elif key == 'friends':
+                self.save_friends()
+
+    def _save_loop(self):
+        """Coalesce writes so each file is saved at most once per SAVE_INTERVAL"""
+        while True:
+            self._save_event.wait()
+            time.sleep(SAVE_INTERVAL)
+            self._save_event.clear()
+            try:
+                self.flush_saves()
+            except Exception as e:
+                logger.error("Error flushing data: %s", e)
 
     def load_users(self):
         """Load users from JSON file"""
         try:
             if os.path.exists('data/users.json'):
-                with open('data/users.json', 'r') as f:
-                    self.users_db = json.load(f)
-                print(f"[SERVER] Loaded {len(self.users_db)} users")
+                self.users_db = load_json_file('data/users.json')
+                logger.info("Loaded %s users", len(self.users_db))
             else:
                 self.users_db = {}
-                print("[SERVER] No users file found, starting fresh")
+                logger.info("No users file found, starting fresh")
         except Exception as e:
-            print(f"[SERVER] Error loading users: {e}")
+            logger.error("Error loading users: %s", e)
             self.users_db = {}
 
     def save_users(self):
         """Save users to JSON file"""
         try:
-            with open('data/users.json', 'w') as f:
-                json.dump(self.users_db, f, indent=2)
-            print(f"[SERVER] Saved {len(self.users_db)} users")
+            with self.lock:
+                data = json_dumps_bytes(self.users_db)
+                count = len(self.users_db)
+            write_file_atomic('data/users.json', data)
+            logger.debug("Saved %s users", count)
         except Exception as e:
-            print(f"[SERVER] Error saving users: {e}")
+            logger.error("Error saving users: %s", e)
 
     def load_groups(self):
         """Load groups from JSON file"""
         try:
             if os.path.exists('data/groups.json'):
-                with open('data/groups.json', 'r') as f:
-                    self.groups_db = json.load(f)
-                print(f"[SERVER] Loaded {len(self.groups_db)} groups")
+                self.groups_db = load_json_file('data/groups.json')
+                logger.info("Loaded %s groups", len(self.groups_db))
             else:
                 self.groups_db = {}
-                print("[SERVER] No groups file found, starting fresh")
+                logger.info("No groups file found, starting fresh")
         except Exception as e:
-            print(f"[SERVER] Error loading groups: {e}")
+            logger.error("Error loading groups: %s", e)
             self.groups_db = {}
+        
+        # Build the username -> groups reverse index
+        self.user_to_groups = {}
+        for group_name, group_data in self.groups_db.items():
+            for member in group_data.get('members', []):
+                self.user_to_groups.setdefault(member, set()).add(group_name)
 
     def save_groups(self):
         """Save groups to JSON file"""
         try:
-            with open('data/groups.json', 'w') as f:
-                json.dump(self.groups_db, f, indent=2)
-            print(f"[SERVER] Saved {len(self.groups_db)} groups")
+            with self.lock:
+                data = json_dumps_bytes(self.groups_db)
+                count = len(self.groups_db)
+            write_file_atomic('data/groups.json', data)
+            logger.debug("Saved %s groups", count)
         except Exception as e:
-            print(f"[SERVER] Error saving groups: {e}")
+            logger.error("Error saving groups: %s", e)
 
     def load_offline_messages(self):
-        """Load offline messages from JSON file"""
+        """Load offline messages from the per-user logs"""
+        self.offline_messages = {}
+        self.offline_bytes = {}
         try:
+            for log_file in glob.glob(os.path.join(OFFLINE_DIR, '*.jsonl')):
+                username = unquote(os.path.basename(log_file)[:-len('.jsonl')])
+                msgs = deque()
+                torn = False
+                with open(log_file, 'rb') as f:
+                    for line in f:
+                        try:
+                            msgs.append(json_loads_bytes(line))
+                        except ValueError:
+                            # A torn last line from a crash mid-append
+                            logger.warning("Skipping unreadable offline message for %s", username)
+                            torn = True
+                if msgs:
+                    self.offline_messages[username] = msgs
+                    self.offline_bytes[username] = sum(offline_message_size(msg) for msg in msgs)
+                if torn:
+                    # Rewrite so later appends do not land on the partial line
+                    self.rewrite_offline_log(username)
+            
+            # Migrate the older single offline_messages.json file
             if os.path.exists('data/offline_messages.json'):
-                with open('data/offline_messages.json', 'r') as f:
-                    self.offline_messages = json.load(f)
-                print(f"[SERVER] Loaded offline messages for {len(self.offline_messages)} users")
+                stored = load_json_file('data/offline_messages.json')
+                for username, messages in stored.items():
+                    if messages:
+                        msgs = self.offline_messages.setdefault(username, deque())
+                        msgs.extend(messages)
+                        self.offline_bytes[username] = sum(offline_message_size(msg) for msg in msgs)
+                        self.rewrite_offline_log(username)
+                os.remove('data/offline_messages.json')
+                logger.info("Migrated offline messages for %s users", len(stored))
+            
+            if self.offline_messages:
+                logger.info("Loaded offline messages for %s users", len(self.offline_messages))
             else:
-                self.offline_messages = {}
-                print("[SERVER] No offline messages file found, starting fresh")
+                logger.info("No offline messages found, starting fresh")
         except Exception as e:
-            print(f"[SERVER] Error loading offline messages: {e}")
-            self.offline_messages = {}
+            logger.error("Error loading offline messages: %s", e)
+
+    def rewrite_offline_log(self, username):
+        """Replace a user's offline log with their current queue (offline_lock held)"""
+        msgs = self.offline_messages.get(username)
+        path = offline_log_path(username)
+        if msgs:
+            write_file_atomic(path, b''.join(json_dumps_bytes(msg) + b'\n' for msg in msgs))
+        elif os.path.exists(path):
+            os.remove(path)
 
-    def save_offline_messages(self):
-        """Save offline messages to JSON file"""
+    def load_all_friends(self):
+        """Load every user's friends from the consolidated friends file"""
         try:
-            with open('data/offline_messages.json', 'w') as f:
-                json.dump(self.offline_messages, f, indent=2)
-            print(f"[SERVER] Saved offline messages for {len(self.offline_messages)} users")
+            if os.path.exists('data/friends.json'):
+                friends_db = load_json_file('data/friends.json')
+                self.friends_cache = {user: set(friends) for user, friends in friends_db.items()}
+                logger.info("Loaded friends for %s users", len(self.friends_cache))
+            else:
+                # Migrate the older per-user friends_<user>.json files
+                self.friends_cache = {}
+                for friend_file in glob.glob('data/friends_*.json'):
+                    username = os.path.basename(friend_file)[len('friends_'):-len('.json')]
+                    self.friends_cache[username] = set(load_json_file(friend_file))
+                if self.friends_cache:
+                    # Write the consolidated file now so the old ones can go
+                    self.save_friends()
+                    if os.path.exists('data/friends.json'):
+                        for friend_file in glob.glob('data/friends_*.json'):
+                            os.remove(friend_file)
+                    logger.info("Migrated friends for %s users", len(self.friends_cache))
+                else:
+                    logger.info("No friends file found, starting fresh")
         except Exception as e:
-            print(f"[SERVER] Error saving offline messages: {e}")
+            logger.error("Error loading friends: %s", e)
+            self.friends_cache = {}
+
+    def are_friends(self, user1, user2):
+        """O(1) friendship check against the cache; never creates entries"""
+        return user2 in self.friends_cache.get(user1, ())
 
-    def get_friend_file_path(self, username):
-        """Get the path to a user's friend file"""
-        return f'data/friends_{username}.json'
+    def require_friends(self, client_socket, from_user, to_user):
+        """Friendship guard for direct messages; tells the sender when it fails"""
+        if self.are_friends(from_user, to_user):
+            return True
+        self.send_json(client_socket, {
+            'type': 'MESSAGE_ERROR',
+            'reason': f'You are not friends with {to_user}'
+        })
+        return False
 
     def load_friends(self, username):
-        """Load friends list for a user"""
-        try:
-            friend_file = self.get_friend_file_path(username)
-            if os.path.exists(friend_file):
-                with open(friend_file, 'r') as f:
-                    friends = json.load(f)
-                return set(friends)
-            else:
-                return set()
-        except Exception as e:
-            print(f"[SERVER] Error loading friends for {username}: {e}")
-            return set()
+        """Get the friend set for a user"""
+        friends = self.friends_cache.get(username)
+        if friends is None:
+            friends = self.friends_cache[username] = set()
+        return friends
 
-    def save_friends(self, username, friends):
-        """Save friends list for a user"""
+    def save_friends(self):
+        """Save all friend lists to the consolidated friends file"""
         try:
-            friend_file = self.get_friend_file_path(username)
-            with open(friend_file, 'w') as f:
-                json.dump(list(friends), f)
-            print(f"[SERVER] Saved {len(friends)} friends for {username}")
+            with self.lock:
+                friends_db = {user: sorted(friends) for user, friends in self.friends_cache.items() if friends}
+            write_file_atomic('data/friends.json', json_dumps_bytes(friends_db))
+            logger.debug("Saved friends for %s users", len(friends_db))
         except Exception as e:
-            print(f"[SERVER] Error saving friends for {username}: {e}")
+            logger.error("Error saving friends: %s", e)
 
     def add_friend_relationship(self, user1, user2):
         """Add bidirectional friendship between two users"""
-        print(f"[SERVER] Adding friend relationship: {user1} <-> {user2}")
+        logger.debug("Adding friend relationship: %s <-> %s", user1, user2)
         
-        # Load both users' friend lists
-        user1_friends = self.load_friends(user1)
-        user2_friends = self.load_friends(user2)
-        
-        # Add each other to friend lists
-        user1_friends.add(user2)
-        user2_friends.add(user1)
+        # Held while mutating so the background saver never sees a set mid-change
+        with self.lock:
+            user1_friends = self.load_friends(user1)
+            user2_friends = self.load_friends(user2)
+            
+            # Add each other to friend lists
+            user1_friends.add(user2)
+            user2_friends.add(user1)
         
         # Save both friend lists
-        self.save_friends(user1, user1_friends)
-        self.save_friends(user2, user2_friends)
+        self.schedule_save('friends')
         
-        print(f"[SERVER] Friend relationship established: {user1} now has {len(user1_friends)} friends, {user2} now has {len(user2_friends)} friends")
+        logger.debug("Friend relationship established: %s now has %s friends, %s now has %s friends", user1, len(user1_friends), user2, len(user2_friends))
 
     def remove_friend_relationship(self, user1, user2):
         """Remove bidirectional friendship between two users"""
-        print(f"[SERVER] Removing friend relationship: {user1} <-> {user2}")
-        
-        # Load both users' friend lists
-        user1_friends = self.load_friends(user1)
-        user2_friends = self.load_friends(user2)
+        logger.debug("Removing friend relationship: %s <-> %s", user1, user2)
         
-        # Remove each other from friend lists
-        user1_friends.discard(user2)
-        user2_friends.discard(user1)
+        # Held while mutating so the background saver never sees a set mid-change
+        with self.lock:
+            user1_friends = self.load_friends(user1)
+            user2_friends = self.load_friends(user2)
+            
+            # Remove each other from friend lists
+            user1_friends.discard(user2)
+            user2_friends.discard(user1)
         
         # Save both friend lists
-        self.save_friends(user1, user1_friends)
-        self.save_friends(user2, user2_friends)
+        self.schedule_save('friends')
         
-        print(f"[SERVER] Friend relationship removed: {user1} now has {len(user1_friends)} friends, {user2} now has {len(user2_friends)} friends")
+        logger.debug("Friend relationship removed: %s now has %s friends, %s now has %s friends", user1, len(user1_friends), user2, len(user2_friends))
 
-    def send_json(self, sock, obj):
-        """Send JSON data to a client"""
+    def frame_message(self, obj):
+        """Serialize a message into the list of buffers sent on the wire"""
+        blob = obj.get('data')
+        if isinstance(blob, (bytes, bytearray)):
+            # Raw file bytes travel in their own frame after the JSON metadata
+            meta = {k: v for k, v in obj.items() if k != 'data'}
+            meta['binary'] = True
+            meta['size'] = len(blob)
+            data = json_dumps_bytes(meta)
+            return [HEADER.pack(len(data)) + data + HEADER.pack(len(blob)), blob]
+        return frame_json(obj)
+
+    def send_raw(self, sock, buffers):
+        """Send an already framed message to a client"""
+        # Several threads may write to one client; whole frames must not interleave.
+        # The lock exists from accept until the handler's cleanup; none means closed.
+        send_lock = self.send_locks.get(sock)
+        if send_lock is None:
+            raise ConnectionError("Connection already closed")
         try:
-            data = json.dumps(obj).encode('utf-8')
-            length = f'{len(data):08d}'.encode('utf-8')
-            sock.sendall(length + data)
+            with send_lock:
+                if not SENDMSG_AVAILABLE:
+                    sock.sendall(b''.join(buffers))
+                    return
+                # Vectored send: the file payload is never copied into one big buffer
+                views = [memoryview(buf) for buf in buffers]
+                while views:
+                    sent = sock.sendmsg(views)
+                    while views and sent >= views[0].nbytes:
+                        sent -= views.pop(0).nbytes
+                    if sent:
+                        views[0] = views[0][sent:]
+        except (BlockingIOError, socket.timeout) as e:
+            # A client that stops reading must not stall the senders; a partial frame
+            # also leaves the stream unusable, so drop the connection
+            logger.warning("Send timed out, dropping slow client: %s", e)
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            raise
         except Exception as e:
-            print(f"[SERVER] Error sending data: {e}")
+            logger.error("Error sending data: %s", e)
             raise
 
-    def recv_json(self, sock):
-        """Receive JSON data from a client"""
+    def send_json(self, sock, obj):
+        """Send JSON data to a client"""
+        self.send_raw(sock, self.frame_message(obj))
+
+    def recv_into_view(self, reader, view):
+        """Fill view completely from a client's buffered reader"""
+        length = len(view)
+        received = 0
+        while received < length:
+            n = reader.readinto(view[received:])
+            if not n:
+                raise ConnectionError("Connection closed by client")
+            received += n
+
+    def recv_exact(self, reader, length):
+        """Receive exactly length bytes into a preallocated buffer"""
+        buf = bytearray(length)
+        self.recv_into_view(reader, memoryview(buf))
+        return buf
+
+    def recv_pooled(self, reader, length):
+        """Receive a small message into this thread's reusable buffer; valid until the next call"""
+        view = getattr(self._recv_local, 'view', None)
+        if view is None:
+            view = self._recv_local.view = memoryview(bytearray(RECV_POOL_SIZE))
+        view = view[:length]
+        self.recv_into_view(reader, view)
+        return view
+
+    def recv_json(self, reader):
+        """Receive JSON data from a client's buffered reader"""
         try:
-            # Receive length header (8 bytes)
-            length_bytes = b''
-            while len(length_bytes) < 8:
-                chunk = sock.recv(8 - len(length_bytes))
-                if not chunk:
-                    raise ConnectionError("Connection closed by client")
-                length_bytes += chunk
-            
-            # Parse length
-            length = int(length_bytes.decode('utf-8'))
-            
-            # Receive data
-            data = b''
-            while len(data) < length:
-                chunk = sock.recv(length - len(data))
-                if not chunk:
-                    raise ConnectionError("Connection closed by client")
-                data += chunk
-            
-            return json.loads(data.decode('utf-8'))
+            length = HEADER.unpack(self.recv_pooled(reader, HEADER.size))[0]
+            if length > MAX_MESSAGE_SIZE:
+                # Refuse before allocating; the stream cannot be resynced, so drop the client
+                raise ConnectionError(f"Invalid message length received: {length}")
+            # Control messages are small; only large ones get a buffer of their own
+            if length <= RECV_POOL_SIZE:
+                data = self.recv_pooled(reader, length)
+            else:
+                data = self.recv_exact(reader, length)
+            message = json_loads_bytes(data)
+            if message.get('binary'):
+                del message['binary']
+                size = HEADER.unpack(self.recv_pooled(reader, HEADER.size))[0]
+                if size != message.pop('size', None) or size > MAX_FILE_SIZE:
+                    # The file bytes are left unread, so the stream is out of step: drop the client
+                    raise ConnectionError(f"Invalid file frame length: {size}")
+                # Keep the receive buffer itself; copying to bytes would duplicate the file
+                message['data'] = self.recv_exact(reader, size)
+            return message
         except Exception as e:
-            print(f"[SERVER] Error receiving data: {e}")
+            logger.error("Error receiving data: %s", e)
             raise
 
+    def is_group_member(self, group_name, username):
+        """Check group membership through the reverse index in O(1)"""
+        return group_name in self.user_to_groups.get(username, ())
+
     def broadcast_to_group(self, group_name, message, exclude_user=None):
         """Broadcast message to all members of a group"""
-        if group_name not in self.groups_db:
-            return
+        # Snapshot the online members under the lock, then send without it
+        targets = []
+        with self.lock:
+            group = self.groups_db.get(group_name)
+            if group is None:
+                return
+            for member in group.get('members', []):
+                if member == exclude_user:
+                    continue
+                member_socket = self.clients.get(member)
+                if member_socket is not None:
+                    targets.append((member, member_socket))
         
-        group_members = self.groups_db[group_name].get('members', [])
-        for member in group_members:
-            if member != exclude_user and member in self.clients:
-                try:
-                    self.send_json(self.clients[member], message)
-                except Exception as e:
-                    print(f"[SERVER] Error broadcasting to {member}: {e}")
+        # Serialize once and reuse the same frame for every member
+        framed = self.frame_message(message)
+        
+        # Send to all members concurrently so one slow client does not delay the rest.
+        # Waiting for every send keeps a sender's messages in order.
+        futures = [(member, self.broadcast_pool.submit(self.send_raw, member_socket, framed))
+                   for member, member_socket in targets]
+        for member, future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                logger.error("Error broadcasting to %s: %s", member, e)
 
     def store_offline_message(self, username, message):
         """Store a message for offline user"""
-        if username not in self.offline_messages:
-            self.offline_messages[username] = []
-        
         # Add timestamp to the message
         message['timestamp'] = datetime.datetime.now().isoformat()
-        self.offline_messages[username].append(message)
-        self.save_offline_messages()
-        print(f"[SERVER] Stored offline message for {username}")
+        # Raw file bytes are stored base64-encoded in the log
+        if isinstance(message.get('data'), (bytes, bytearray)):
+            message['data'] = base64.b64encode(message['data']).decode('ascii')
+        line = json_dumps_bytes(message) + b'\n'
+        
+        try:
+            with self.offline_lock:
+                msgs = self.offline_messages.get(username)
+                if msgs is None:
+                    msgs = self.offline_messages[username] = deque()
+                msgs.append(message)
+                size = self.offline_bytes.get(username, 0) + offline_message_size(message)
+                
+                # Enforce the per-user limits, keeping at least the newest message
+                dropped = False
+                while len(msgs) > 1 and (len(msgs) > OFFLINE_MAX_MESSAGES or size > OFFLINE_MAX_BYTES):
+                    size -= offline_message_size(msgs.popleft())
+                    dropped = True
+                self.offline_bytes[username] = size
+                
+                if dropped:
+                    logger.warning("Offline queue for %s full, dropped oldest messages", username)
+                    self.rewrite_offline_log(username)
+                else:
+                    # Appending one line avoids rewriting everything already queued
+                    with open(offline_log_path(username), 'ab') as f:
+                        f.write(line)
+            logger.debug("Stored offline message for %s", username)
+        except Exception as e:
+            logger.error("Error storing offline message for %s: %s", username, e)
+
+    def offline_frames(self, pending):
+        """Yield (message count, buffers) for delivering an offline queue in order.
+        Files go out as binary MEDIA frames flagged 'offline'; other messages are batched
+        into OFFLINE_MESSAGES frames that stay under the client's MAX_MESSAGE_SIZE."""
+        batch, batch_size = [], 0
+        for msg in pending:
+            if msg.get('is_file'):
+                if batch:
+                    yield len(batch), frame_json({'type': 'OFFLINE_MESSAGES', 'messages': batch})
+                    batch, batch_size = [], 0
+                media = {k: v for k, v in msg.items() if k not in ('is_file', 'sender_info')}
+                media['data'] = base64.b64decode(msg['data'])
+                media['offline'] = True
+                yield 1, self.frame_message(media)
+                continue
+            # Sender profiles are looked up at delivery instead of being stored per message.
+            # Older entries stored the full user record, password included, so never reuse it.
+            if 'from' in msg:
+                msg = {**msg, 'sender_info': self.sender_info(msg['from'])}
+            elif 'sender_info' in msg:
+                msg = {**msg, 'sender_info': public_user_info(msg['sender_info'])}
+            size = len(json_dumps_bytes(msg)) + 1
+            if batch and batch_size + size > MAX_MESSAGE_SIZE - 64:
+                yield len(batch), frame_json({'type': 'OFFLINE_MESSAGES', 'messages': batch})
+                batch, batch_size = [], 0
+            batch.append(msg)
+            batch_size += size
+        if batch:
+            yield len(batch), frame_json({'type': 'OFFLINE_MESSAGES', 'messages': batch})
 
     def send_offline_messages(self, username):
         """Send all offline messages to a user when they come online"""
-        if username in self.offline_messages and self.offline_messages[username]:
-            messages = self.offline_messages[username]
-            try:
-                self.send_json(self.clients[username], {
-                    'type': 'OFFLINE_MESSAGES',
-                    'messages': messages
-                })
-                print(f"[SERVER] Sent {len(messages)} offline messages to {username}")
-                
-                # Clear offline messages after sending
-                self.offline_messages[username] = []
-                self.save_offline_messages()
-                
-            except Exception as e:
-                print(f"[SERVER] Error sending offline messages to {username}: {e}")
+        # Take the whole queue; messages stored meanwhile start a fresh queue
+        with self.offline_lock:
+            pending = self.offline_messages.pop(username, None)
+            self.offline_bytes.pop(username, None)
+        if not pending:
+            return
+        
+        sent = 0
+        try:
+            sock = self.clients[username]
+            for count, buffers in self.offline_frames(pending):
+                self.send_raw(sock, buffers)
+                sent += count
+            logger.debug("Sent %s offline messages to %s", sent, username)
+        except Exception as e:
+            logger.error("Error sending offline messages to %s: %s", username, e)
+            # Put the undelivered messages back in front of any newer ones
+            with self.offline_lock:
+                msgs = self.offline_messages.setdefault(username, deque())
+                msgs.extendleft(reversed(list(pending)[sent:]))
+                self.offline_bytes[username] = sum(offline_message_size(msg) for msg in msgs)
+                self.rewrite_offline_log(username)
+            return
+        
+        # Only now drop the delivered messages from the log
+        with self.offline_lock:
+            self.rewrite_offline_log(username)
 
     def handle_client(self, client_socket, client_address):
         """Handle communication with a client"""
         username = None
+        self.send_locks[client_socket] = threading.Lock()
+        self.connections.add(client_socket)
+        # Buffered reads pick up several queued messages per recv syscall
+        reader = client_socket.makefile('rb', buffering=RECV_BUFFER_SIZE)
+        # Unauthenticated connections must not hold a handler slot indefinitely
+        client_socket.settimeout(LOGIN_TIMEOUT)
         try:
-            print(f"[SERVER] New client connected from {client_address}")
+            logger.info("New client connected from %s", client_address)
             
             while True:
                 try:
-                    message = self.recv_json(client_socket)
+                    message = self.recv_json(reader)
                     msg_type = message.get('type')
                     
-                    if msg_type == 'REGISTER':
+                    # Reject incomplete requests up front instead of failing inside the handler
+                    missing = [field for field in REQUIRED_FIELDS.get(msg_type, ()) if field not in message]
+                    if missing:
+                        logger.warning("%s message from %s is missing %s", msg_type, username or client_address, missing)
+                        self.send_json(client_socket, {
+                            'type': 'ERROR',
+                            'message': f"Missing fields: {', '.join(missing)}"
+                        })
+                        continue
+                    
+                    handler = self.handlers.get(msg_type)
+                    if handler is not None:
+                        handler(client_socket, message)
+                    elif msg_type in ('REGISTER', 'LOGIN') and message.get('version') != PROTOCOL_VERSION:
+                        logger.warning("%s from %s with protocol version %s", msg_type, client_address, message.get('version'))
+                        self.send_raw(client_socket, error_frame('ERROR', f'Unsupported protocol version; server speaks {PROTOCOL_VERSION}'))
+                    elif msg_type == 'REGISTER':
                         username = self.handle_register(client_socket, message)
+                        if username:
+                            client_socket.settimeout(None)
                     elif msg_type == 'LOGIN':
                         username = self.handle_login(client_socket, message)
-                    elif msg_type == 'LIST_REQUEST':
-                        self.handle_list_request(client_socket)
-                    elif msg_type == 'GET_ALL_USERS':
-                        self.handle_get_all_users(client_socket)
-                    elif msg_type == 'FRIEND_REQUEST':
-                        self.handle_friend_request(client_socket, message)
-                    elif msg_type == 'FRIEND_REQUEST_RESPONSE':
-                        self.handle_friend_request_response(client_socket, message)
-                    elif msg_type == 'PRIVATE_MESSAGE':
-                        self.handle_private_message(client_socket, message)
-                    elif msg_type == 'GROUP_MESSAGE':
-                        self.handle_group_message(client_socket, message)
-                    elif msg_type == 'MEDIA':
-                        self.handle_media_message(client_socket, message)
-                    elif msg_type == 'GROUP_MEDIA':
-                        self.handle_group_media(client_socket, message)
-                    elif msg_type == 'CREATE_GROUP':
-                        self.handle_create_group(client_socket, message)
-                    elif msg_type == 'GROUP_INVITE':
-                        self.handle_group_invite(client_socket, message)
-                    elif msg_type == 'GROUP_INVITE_RESPONSE':
-                        self.handle_group_invite_response(client_socket, message)
-                    elif msg_type == 'JOIN_GROUP':
-                        self.handle_join_group(client_socket, message)
-                    elif msg_type == 'LEAVE_GROUP':
-                        self.handle_leave_group(client_socket, message)
-                    elif msg_type == 'UNFRIEND':
-                        self.handle_unfriend(client_socket, message)
-                    elif msg_type == 'GET_FRIEND_LIST':
-                        self.handle_get_friend_list(client_socket, message)
-                    elif msg_type == 'EDIT_PROFILE':
-                        self.handle_edit_profile(client_socket, message)
-                    elif msg_type == 'PING':
-                        self.send_json(client_socket, {'type': 'PONG'})
+                        if username:
+                            client_socket.settimeout(None)
                     elif msg_type == 'LOGOUT':
-                        print(f"[SERVER] {username} logged out")
+                        logger.info("%s logged out", username)
                         break
                     else:
-                        print(f"[SERVER] Unknown message type: {msg_type}")
+                        logger.warning("Unknown message type: %s", msg_type)
+                        self.send_raw(client_socket, error_frame('ERROR', 'Unknown message type'))
                         
                 except ConnectionError:
-                    print(f"[SERVER] Connection lost with {username or client_address}")
+                    logger.info("Connection lost with %s", username or client_address)
+                    break
+                except socket.timeout:
+                    logger.info("No login from %s within %ss, closing", client_address, LOGIN_TIMEOUT)
                     break
                 except Exception as e:
-                    print(f"[SERVER] Error handling message from {username or client_address}: {e}")
+                    logger.error("Error handling message from %s: %s", username or client_address, e)
                     continue
                     
         except Exception as e:
-            print(f"[SERVER] Error in client handler for {username or client_address}: {e}")
+            logger.error("Error in client handler for %s: %s", username or client_address, e)
         finally:
             # Clean up client connection
             if username and username in self.clients:
                 with self.lock:
                     del self.clients[username]
-                print(f"[SERVER] {username} disconnected")
+                    self.presence_version += 1
+                logger.info("%s disconnected", username)
+            self.send_locks.pop(client_socket, None)
+            self.connections.discard(client_socket)
             
             try:
+                reader.close()
                 client_socket.close()
             except:
                 pass
+            self.client_slots.release()
 
     def handle_register(self, client_socket, message):
         """Handle user registration"""
         try:
-            user_data = message['data']
+            user_data = dict(message['data'])
             username = user_data['name']
+            # Hash before taking the lock; PBKDF2 is deliberately slow
+            user_data.update(hash_password(user_data.pop('password', '')))
             
+            # Only the shared dicts are touched under the lock; sends happen outside it
+            with self.lock:
+                exists = username in self.users_db
+                if not exists:
+                    # Store user data
+                    self.users_db[username] = user_data
+                    self.users_version += 1
+                    user_groups = list(self.user_to_groups.get(username, ()))
+            
+            if exists:
+                self.send_raw(client_socket, error_frame('REGISTER_ERROR', 'Username already exists'))
+                return None
+            
+            self.schedule_save('users')
+            self.send_json(client_socket, {
+                'type': 'REGISTER_SUCCESS',
+                'groups': user_groups
+            })
+            
+            # Add client to active clients
             with self.lock:
-                if username in self.users_db:
-                    self.send_json(client_socket, {
-                        'type': 'REGISTER_ERROR',
-                        'message': 'Username already exists'
-                    })
-                    return None
-                
-                # Store user data
-                self.users_db[username] = user_data
-                self.save_users()
-                
-                # Add client to active clients
                 self.clients[username] = client_socket
-                
-                # Get user's groups
-                user_groups = []
-                for group_name, group_data in self.groups_db.items():
-                    if username in group_data.get('members', []):
-                        user_groups.append(group_name)
-                
-                self.send_json(client_socket, {
-                    'type': 'REGISTER_SUCCESS',
-                    'groups': user_groups
-                })
-                
-                # Send offline messages
-                self.send_offline_messages(username)
-                
-                print(f"[SERVER] User {username} registered successfully")
-                return username
+                self.presence_version += 1
+            
+            # Send offline messages
+            self.send_offline_messages(username)
+            
+            logger.info("User %s registered successfully", username)
+            return username
                 
         except Exception as e:
-            print(f"[SERVER] Error in registration: {e}")
-            self.send_json(client_socket, {
-                'type': 'REGISTER_ERROR',
-                'message': 'Registration failed'
-            })
+            logger.error("Error in registration: %s", e)
+            self.send_raw(client_socket, error_frame('REGISTER_ERROR', 'Registration failed'))
             return None
 
     def handle_login(self, client_socket, message):
@@ -371,71 +824,112 @@ class ChatServer:
             password = message['password']
             
             with self.lock:
-                if username not in self.users_db:
-                    self.send_json(client_socket, {
-                        'type': 'LOGIN_ERROR',
-                        'message': 'User not found'
-                    })
-                    return None
-                
-                if self.users_db[username]['password'] != password:
-                    self.send_json(client_socket, {
-                        'type': 'LOGIN_ERROR',
-                        'message': 'Invalid password'
-                    })
-                    return None
-                
-                # Add client to active clients
+                record = self.users_db.get(username)
+            
+            if record is None:
+                self.send_raw(client_socket, error_frame('LOGIN_ERROR', 'User not found'))
+                return None
+            
+            # Verify outside the lock; PBKDF2 is deliberately slow
+            if not verify_password(record, password):
+                self.send_raw(client_socket, error_frame('LOGIN_ERROR', 'Invalid password'))
+                return None
+            
+            if 'password' in record:
+                # Upgrade a legacy plaintext record to a salted hash
+                upgraded = hash_password(password)
+                with self.lock:
+                    record.pop('password', None)
+                    record.update(upgraded)
+                self.schedule_save('users')
+            
+            with self.lock:
+                user_info = public_user_info(record)
+                user_groups = list(self.user_to_groups.get(username, ()))
+            
+            self.send_json(client_socket, {
+                'type': 'LOGIN_SUCCESS',
+                'user_info': user_info,
+                'groups': user_groups
+            })
+            
+            # Add client to active clients
+            with self.lock:
                 self.clients[username] = client_socket
-                
-                # Get user's groups
-                user_groups = []
-                for group_name, group_data in self.groups_db.items():
-                    if username in group_data.get('members', []):
-                        user_groups.append(group_name)
-                
-                self.send_json(client_socket, {
-                    'type': 'LOGIN_SUCCESS',
-                    'user_info': self.users_db[username],
-                    'groups': user_groups
-                })
-                
-                # Send offline messages
-                self.send_offline_messages(username)
-                
-                print(f"[SERVER] User {username} logged in successfully")
-                return username
+                self.presence_version += 1
+            
+            # Send offline messages
+            self.send_offline_messages(username)
+            
+            logger.info("User %s logged in successfully", username)
+            return username
                 
         except Exception as e:
-            print(f"[SERVER] Error in login: {e}")
-            self.send_json(client_socket, {
-                'type': 'LOGIN_ERROR',
-                'message': 'Login failed'
-            })
+            logger.error("Error in login: %s", e)
+            self.send_raw(client_socket, error_frame('LOGIN_ERROR', 'Login failed'))
             return None
 
-    def handle_list_request(self, client_socket):
+    def sender_info(self, username):
+        """Public profile attached to outgoing requests, cached until a user record changes"""
+        version, cache = self._sender_info_cache
+        if version != self.users_version:
+            version, cache = self._sender_info_cache = (self.users_version, {})
+        info = cache.get(username)
+        if info is None:
+            info = cache[username] = public_user_info(self.users_db.get(username, {}))
+        return info
+
+    def cached_reply(self, msg_type, version, build):
+        """Frame for a reply that only changes with version; build() makes the message"""
+        cached = self._reply_cache.get(msg_type)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        frame = tuple(frame_json(build()))
+        self._reply_cache[msg_type] = (version, frame)
+        return frame
+
+    def handle_list_request(self, client_socket, message):
         """Handle request for online users list"""
         try:
-            with self.lock:
-                online_users = list(self.clients.keys())
-                self.send_json(client_socket, {
-                    'type': 'LIST_RESPONSE',
-                    'users': online_users
-                })
+            # list() over dict keys is a consistent snapshot under the GIL
+            frame = self.cached_reply('LIST_RESPONSE', self.presence_version, lambda: {
+                'type': 'LIST_RESPONSE',
+                'users': list(self.clients)
+            })
+            self.send_raw(client_socket, frame)
         except Exception as e:
-            print(f"[SERVER] Error handling list request: {e}")
+            logger.error("Error handling list request: %s", e)
 
-    def handle_get_all_users(self, client_socket):
+    def build_all_users(self):
+        """ALL_USERS_RESPONSE message with every user's public profile"""
+        with self.lock:
+            users = {name: public_user_info(info) for name, info in self.users_db.items()}
+        return {
+            'type': 'ALL_USERS_RESPONSE',
+            'users': users
+        }
+
+    def handle_get_all_users(self, client_socket, message):
         """Handle request for all registered users"""
         try:
-            with self.lock:
-                self.send_json(client_socket, {
-                    'type': 'ALL_USERS_RESPONSE',
-                    'users': self.users_db
-                })
+            frame = self.cached_reply('ALL_USERS_RESPONSE', self.users_version, self.build_all_users)
+            self.send_raw(client_socket, frame)
+        except Exception as e:
+            logger.error("Error handling get all users request: %s", e)
+
+    def handle_status(self, client_socket, message):
+        """Report which of the given friends are online"""
+        try:
+            self.send_json(client_socket, {
+                'type': 'STATUS_RESPONSE',
+                'status': {friend: friend in self.clients for friend in message.get('friends', ())}
+            })
         except Exception as e:
-            print(f"[SERVER] Error handling get all users request: {e}")
+            logger.error("Error handling status request: %s", e)
+
+    def handle_ping(self, client_socket, message):
+        """Answer a keepalive ping"""
+        self.send_raw(client_socket, PONG_FRAME)
 
     def handle_friend_request(self, client_socket, message):
         """Handle friend request"""
@@ -443,35 +937,32 @@ class ChatServer:
             from_user = message['from']
             to_user = message['to']
             
-            print(f"[SERVER] Friend request: {from_user} -> {to_user}")
+            logger.debug("Friend request: %s -> %s", from_user, to_user)
             
             # Check if target user exists
             if to_user not in self.users_db:
-                self.send_json(client_socket, {
-                    'type': 'FRIEND_REQUEST_ERROR',
-                    'message': 'User not found'
-                })
+                self.send_raw(client_socket, error_frame('FRIEND_REQUEST_ERROR', 'User not found'))
                 return
             
             # Get sender info for the request
-            sender_info = self.users_db.get(from_user, {})
+            sender_info = self.sender_info(from_user)
             
             # If target user is online, send request immediately
-            if to_user in self.clients:
+            target_socket = self.clients.get(to_user)
+            if target_socket is not None:
                 try:
-                    self.send_json(self.clients[to_user], {
+                    self.send_json(target_socket, {
                         'type': 'FRIEND_REQUEST',
                         'from': from_user,
                         'sender_info': sender_info
                     })
-                    print(f"[SERVER] Friend request delivered to {to_user}")
+                    logger.debug("Friend request delivered to %s", to_user)
                 except Exception as e:
-                    print(f"[SERVER] Error sending friend request to {to_user}: {e}")
+                    logger.error("Error sending friend request to %s: %s", to_user, e)
                     # Store as offline message if sending fails
                     self.store_offline_message(to_user, {
                         'type': 'FRIEND_REQUEST',
                         'from': from_user,
-                        'sender_info': sender_info,
                         'is_friend_request': True
                     })
             else:
@@ -479,13 +970,12 @@ class ChatServer:
                 self.store_offline_message(to_user, {
                     'type': 'FRIEND_REQUEST',
                     'from': from_user,
-                    'sender_info': sender_info,
                     'is_friend_request': True
                 })
-                print(f"[SERVER] Friend request stored as offline message for {to_user}")
+                logger.debug("Friend request stored as offline message for %s", to_user)
             
         except Exception as e:
-            print(f"[SERVER] Error handling friend request: {e}")
+            logger.error("Error handling friend request: %s", e)
 
     def handle_friend_request_response(self, client_socket, message):
         """Handle friend request response (accept/decline)"""
@@ -494,22 +984,23 @@ class ChatServer:
             to_user = message['to']      # User who sent the request
             accepted = message['accepted']
             
-            print(f"[SERVER] Friend request response: {from_user} {'accepted' if accepted else 'declined'} {to_user}")
+            logger.debug("Friend request response: %s %s %s", from_user, 'accepted' if accepted else 'declined', to_user)
             
             if accepted:
                 # Add bidirectional friendship
                 self.add_friend_relationship(from_user, to_user)
                 
                 # Notify the original requester
-                if to_user in self.clients:
+                target_socket = self.clients.get(to_user)
+                if target_socket is not None:
                     try:
-                        self.send_json(self.clients[to_user], {
+                        self.send_json(target_socket, {
                             'type': 'FRIEND_REQUEST_ACCEPTED',
                             'from': from_user
                         })
-                        print(f"[SERVER] Acceptance notification sent to {to_user}")
+                        logger.debug("Acceptance notification sent to %s", to_user)
                     except Exception as e:
-                        print(f"[SERVER] Error notifying {to_user} of acceptance: {e}")
+                        logger.error("Error notifying %s of acceptance: %s", to_user, e)
                         # Store as offline message
                         self.store_offline_message(to_user, {
                             'type': 'FRIEND_REQUEST_ACCEPTED',
@@ -528,20 +1019,21 @@ class ChatServer:
                         'type': 'FRIEND_ADDED',
                         'friend': to_user
                     })
-                    print(f"[SERVER] Friend added notification sent to {from_user}")
+                    logger.debug("Friend added notification sent to %s", from_user)
                 except Exception as e:
-                    print(f"[SERVER] Error sending friend added notification: {e}")
+                    logger.error("Error sending friend added notification: %s", e)
                     
             else:
                 # Notify the original requester of decline
-                if to_user in self.clients:
+                target_socket = self.clients.get(to_user)
+                if target_socket is not None:
                     try:
-                        self.send_json(self.clients[to_user], {
+                        self.send_json(target_socket, {
                             'type': 'FRIEND_REQUEST_DECLINED',
                             'from': from_user
                         })
                     except Exception as e:
-                        print(f"[SERVER] Error notifying {to_user} of decline: {e}")
+                        logger.error("Error notifying %s of decline: %s", to_user, e)
                         # Store as offline message
                         self.store_offline_message(to_user, {
                             'type': 'FRIEND_REQUEST_DECLINED',
@@ -555,7 +1047,7 @@ class ChatServer:
                     })
             
         except Exception as e:
-            print(f"[SERVER] Error handling friend request response: {e}")
+            logger.error("Error handling friend request response: %s", e)
 
     def handle_private_message(self, client_socket, message):
         """Handle private message"""
@@ -563,38 +1055,33 @@ class ChatServer:
             from_user = message['from']
             to_user = message['to']
             msg_text = message['msg']
-            timestamp = message.get('timestamp', datetime.datetime.now().isoformat())
             
-            print(f"[SERVER] Private message: {from_user} -> {to_user}: {msg_text[:50]}...")
+            logger.debug("Private message: %s -> %s: %.50s...", from_user, to_user, msg_text)
             
-            # Check if users are friends
-            from_friends = self.load_friends(from_user)
-            if to_user not in from_friends:
-                self.send_json(client_socket, {
-                    'type': 'MESSAGE_ERROR',
-                    'reason': f'You are not friends with {to_user}'
-                })
+            if not self.require_friends(client_socket, from_user, to_user):
                 return
             
+            timestamp = message.get('timestamp') or datetime.datetime.now().isoformat()
+            
             # If target user is online, send message immediately
-            if to_user in self.clients:
+            target_socket = self.clients.get(to_user)
+            if target_socket is not None:
                 try:
-                    self.send_json(self.clients[to_user], {
+                    self.send_json(target_socket, {
                         'type': 'PRIVATE_MESSAGE',
                         'from': from_user,
                         'msg': msg_text,
                         'timestamp': timestamp
                     })
-                    print(f"[SERVER] Private message delivered to {to_user}")
+                    logger.debug("Private message delivered to %s", to_user)
                 except Exception as e:
-                    print(f"[SERVER] Error sending message to {to_user}: {e}")
+                    logger.error("Error sending message to %s: %s", to_user, e)
                     # Store as offline message if sending fails
                     self.store_offline_message(to_user, {
                         'type': 'PRIVATE_MESSAGE',
                         'from': from_user,
                         'msg': msg_text,
-                        'timestamp': timestamp,
-                        'sender_info': self.users_db.get(from_user, {})
+                        'timestamp': timestamp
                     })
             else:
                 # Store as offline message
@@ -602,13 +1089,12 @@ class ChatServer:
                     'type': 'PRIVATE_MESSAGE',
                     'from': from_user,
                     'msg': msg_text,
-                    'timestamp': timestamp,
-                    'sender_info': self.users_db.get(from_user, {})
+                    'timestamp': timestamp
                 })
-                print(f"[SERVER] Private message stored as offline message for {to_user}")
+                logger.debug("Private message stored as offline message for %s", to_user)
             
         except Exception as e:
-            print(f"[SERVER] Error handling private message: {e}")
+            logger.error("Error handling private message: %s", e)
 
     def handle_group_message(self, client_socket, message):
         """Handle group message"""
@@ -616,9 +1102,8 @@ class ChatServer:
             from_user = message['from']
             group_name = message['group_name']
             msg_text = message['msg']
-            timestamp = message.get('timestamp', datetime.datetime.now().isoformat())
             
-            print(f"[SERVER] Group message: {from_user} -> {group_name}: {msg_text[:50]}...")
+            logger.debug("Group message: %s -> %s: %.50s...", from_user, group_name, msg_text)
             
             # Check if group exists and user is a member
             if group_name not in self.groups_db:
@@ -628,13 +1113,15 @@ class ChatServer:
                 })
                 return
             
-            if from_user not in self.groups_db[group_name]['members']:
+            if not self.is_group_member(group_name, from_user):
                 self.send_json(client_socket, {
                     'type': 'MESSAGE_ERROR',
                     'reason': f'You are not a member of {group_name}'
                 })
                 return
             
+            timestamp = message.get('timestamp') or datetime.datetime.now().isoformat()
+            
             # Broadcast to all group members
             group_message = {
                 'type': 'GROUP_MESSAGE',
@@ -645,10 +1132,10 @@ class ChatServer:
             }
             
             self.broadcast_to_group(group_name, group_message, exclude_user=from_user)
-            print(f"[SERVER] Group message broadcasted to {group_name}")
+            logger.debug("Group message broadcasted to %s", group_name)
             
         except Exception as e:
-            print(f"[SERVER] Error handling group message: {e}")
+            logger.error("Error handling group message: %s", e)
 
     def handle_media_message(self, client_socket, message):
         """Handle media (file) message"""
@@ -657,32 +1144,28 @@ class ChatServer:
             to_user = message['to']
             filename = message['filename']
             filedata = message['data']
-            timestamp = message.get('timestamp', datetime.datetime.now().isoformat())
             
-            print(f"[SERVER] Media message: {from_user} -> {to_user}: {filename}")
+            logger.debug("Media message: %s -> %s: %s", from_user, to_user, filename)
             
-            # Check if users are friends
-            from_friends = self.load_friends(from_user)
-            if to_user not in from_friends:
-                self.send_json(client_socket, {
-                    'type': 'MESSAGE_ERROR',
-                    'reason': f'You are not friends with {to_user}'
-                })
+            if not self.require_friends(client_socket, from_user, to_user):
                 return
             
+            timestamp = message.get('timestamp') or datetime.datetime.now().isoformat()
+            
             # If target user is online, send media immediately
-            if to_user in self.clients:
+            target_socket = self.clients.get(to_user)
+            if target_socket is not None:
                 try:
-                    self.send_json(self.clients[to_user], {
+                    self.send_json(target_socket, {
                         'type': 'MEDIA',
                         'from': from_user,
                         'filename': filename,
                         'data': filedata,
                         'timestamp': timestamp
                     })
-                    print(f"[SERVER] Media message delivered to {to_user}")
+                    logger.debug("Media message delivered to %s", to_user)
                 except Exception as e:
-                    print(f"[SERVER] Error sending media to {to_user}: {e}")
+                    logger.error("Error sending media to %s: %s", to_user, e)
                     # Store as offline message if sending fails
                     self.store_offline_message(to_user, {
                         'type': 'MEDIA',
@@ -690,8 +1173,7 @@ class ChatServer:
                         'filename': filename,
                         'data': filedata,
                         'timestamp': timestamp,
-                        'is_file': True,
-                        'sender_info': self.users_db.get(from_user, {})
+                        'is_file': True
                     })
             else:
                 # Store as offline message
@@ -701,13 +1183,12 @@ class ChatServer:
                     'filename': filename,
                     'data': filedata,
                     'timestamp': timestamp,
-                    'is_file': True,
-                    'sender_info': self.users_db.get(from_user, {})
+                    'is_file': True
                 })
-                print(f"[SERVER] Media message stored as offline message for {to_user}")
+                logger.debug("Media message stored as offline message for %s", to_user)
             
         except Exception as e:
-            print(f"[SERVER] Error handling media message: {e}")
+            logger.error("Error handling media message: %s", e)
 
     def handle_group_media(self, client_socket, message):
         """Handle group media (file) message"""
@@ -716,9 +1197,8 @@ class ChatServer:
             group_name = message['group_name']
             filename = message['filename']
             filedata = message['data']
-            timestamp = message.get('timestamp', datetime.datetime.now().isoformat())
             
-            print(f"[SERVER] Group media: {from_user} -> {group_name}: {filename}")
+            logger.debug("Group media: %s -> %s: %s", from_user, group_name, filename)
             
             # Check if group exists and user is a member
             if group_name not in self.groups_db:
@@ -728,13 +1208,15 @@ class ChatServer:
                 })
                 return
             
-            if from_user not in self.groups_db[group_name]['members']:
+            if not self.is_group_member(group_name, from_user):
                 self.send_json(client_socket, {
                     'type': 'MESSAGE_ERROR',
                     'reason': f'You are not a member of {group_name}'
                 })
                 return
             
+            timestamp = message.get('timestamp') or datetime.datetime.now().isoformat()
+            
             # Broadcast to all group members
             group_media = {
                 'type': 'GROUP_MEDIA',
@@ -746,10 +1228,10 @@ class ChatServer:
             }
             
             self.broadcast_to_group(group_name, group_media, exclude_user=from_user)
-            print(f"[SERVER] Group media broadcasted to {group_name}")
+            logger.debug("Group media broadcasted to %s", group_name)
             
         except Exception as e:
-            print(f"[SERVER] Error handling group media: {e}")
+            logger.error("Error handling group media: %s", e)
 
     def handle_create_group(self, client_socket, message):
         """Handle group creation"""
@@ -758,39 +1240,36 @@ class ChatServer:
             creator = message['creator']
             description = message.get('description', '')
             
-            print(f"[SERVER] Creating group: {group_name} by {creator}")
+            logger.debug("Creating group: %s by %s", group_name, creator)
             
             with self.lock:
-                if group_name in self.groups_db:
-                    self.send_json(client_socket, {
-                        'type': 'CREATE_GROUP_ERROR',
-                        'message': 'Group already exists'
-                    })
-                    return
-                
-                # Create group
-                self.groups_db[group_name] = {
-                    'admin': creator,
-                    'members': [creator],
-                    'description': description,
-                    'created_at': datetime.datetime.now().isoformat()
-                }
-                
-                self.save_groups()
-                
-                self.send_json(client_socket, {
-                    'type': 'CREATE_GROUP_SUCCESS',
-                    'group_name': group_name
-                })
-                
-                print(f"[SERVER] Group {group_name} created successfully")
-                
-        except Exception as e:
-            print(f"[SERVER] Error creating group: {e}")
+                exists = group_name in self.groups_db
+                if not exists:
+                    # Create group
+                    self.groups_db[group_name] = {
+                        'admin': creator,
+                        'members': [creator],
+                        'description': description,
+                        'created_at': datetime.datetime.now().isoformat()
+                    }
+                    self.user_to_groups.setdefault(creator, set()).add(group_name)
+            
+            if exists:
+                self.send_raw(client_socket, error_frame('CREATE_GROUP_ERROR', 'Group already exists'))
+                return
+            
+            self.schedule_save('groups')
+            
             self.send_json(client_socket, {
-                'type': 'CREATE_GROUP_ERROR',
-                'message': 'Failed to create group'
+                'type': 'CREATE_GROUP_SUCCESS',
+                'group_name': group_name
             })
+            
+            logger.debug("Group %s created successfully", group_name)
+                
+        except Exception as e:
+            logger.error("Error creating group: %s", e)
+            self.send_raw(client_socket, error_frame('CREATE_GROUP_ERROR', 'Failed to create group'))
 
     def handle_group_invite(self, client_socket, message):
         """Handle group invitation"""
@@ -798,39 +1277,27 @@ class ChatServer:
             from_user = message['from']
             to_user = message['to']
             group_name = message['group_name']
-            sender_info = message.get('inviter_info', self.users_db.get(from_user, {}))
+            sender_info = message.get('inviter_info') or self.sender_info(from_user)
             
-            print(f"[SERVER] Group invite: {from_user} inviting {to_user} to {group_name}")
+            logger.debug("Group invite: %s inviting %s to %s", from_user, to_user, group_name)
             
             # Check if group exists and sender is a member
             if group_name not in self.groups_db:
-                self.send_json(client_socket, {
-                    'type': 'GROUP_INVITE_ERROR',
-                    'message': 'Group does not exist'
-                })
+                self.send_raw(client_socket, error_frame('GROUP_INVITE_ERROR', 'Group does not exist'))
                 return
             
-            if from_user not in self.groups_db[group_name]['members']:
-                self.send_json(client_socket, {
-                    'type': 'GROUP_INVITE_ERROR',
-                    'message': 'You are not a member of this group'
-                })
+            if not self.is_group_member(group_name, from_user):
+                self.send_raw(client_socket, error_frame('GROUP_INVITE_ERROR', 'You are not a member of this group'))
                 return
             
             # Check if target user exists
             if to_user not in self.users_db:
-                self.send_json(client_socket, {
-                    'type': 'GROUP_INVITE_ERROR',
-                    'message': 'User not found'
-                })
+                self.send_raw(client_socket, error_frame('GROUP_INVITE_ERROR', 'User not found'))
                 return
             
             # Check if user is already in the group
-            if to_user in self.groups_db[group_name]['members']:
-                self.send_json(client_socket, {
-                    'type': 'GROUP_INVITE_ERROR',
-                    'message': 'User is already a member of this group'
-                })
+            if self.is_group_member(group_name, to_user):
+                self.send_raw(client_socket, error_frame('GROUP_INVITE_ERROR', 'User is already a member of this group'))
                 return
             
             # Send invitation
@@ -841,27 +1308,23 @@ class ChatServer:
                 'sender_info': sender_info
             }
             
-            if to_user in self.clients:
+            target_socket = self.clients.get(to_user)
+            if target_socket is not None:
                 try:
-                    self.send_json(self.clients[to_user], invite_message)
-                    print(f"[SERVER] Group invitation sent to {to_user}")
+                    self.send_json(target_socket, invite_message)
+                    logger.debug("Group invitation sent to %s", to_user)
+                    return
                 except Exception as e:
-                    print(f"[SERVER] Error sending group invite to {to_user}: {e}")
-                    # Store as offline message
-                    self.store_offline_message(to_user, {
-                        **invite_message,
-                        'is_group_invite': True
-                    })
-            else:
-                # Store as offline message
-                self.store_offline_message(to_user, {
-                    **invite_message,
-                    'is_group_invite': True
-                })
-                print(f"[SERVER] Group invitation stored as offline message for {to_user}")
+                    logger.error("Error sending group invite to %s: %s", to_user, e)
+            
+            # User is offline or the send failed: store once for their next login.
+            # invite_message is local to this call, so flag it in place instead of copying.
+            invite_message['is_group_invite'] = True
+            self.store_offline_message(to_user, invite_message)
+            logger.debug("Group invitation stored as offline message for %s", to_user)
             
         except Exception as e:
-            print(f"[SERVER] Error handling group invite: {e}")
+            logger.error("Error handling group invite: %s", e)
 
     def handle_group_invite_response(self, client_socket, message):
         """Handle group invitation response"""
@@ -871,58 +1334,61 @@ class ChatServer:
             accepted = message['accepted']
             inviter = message.get('inviter')
             
-            print(f"[SERVER] Group invite response: {from_user} {'accepted' if accepted else 'declined'} invite to {group_name}")
+            logger.debug("Group invite response: %s %s invite to %s", from_user, 'accepted' if accepted else 'declined', group_name)
             
             if accepted:
                 # Add user to group
+                error = None
                 with self.lock:
-                    if group_name in self.groups_db:
-                        if from_user not in self.groups_db[group_name]['members']:
-                            self.groups_db[group_name]['members'].append(from_user)
-                            self.save_groups()
-                            
-                            # Notify user of successful join
-                            self.send_json(client_socket, {
-                                'type': 'GROUP_JOIN_SUCCESS',
-                                'group_name': group_name
-                            })
-                            
-                            # Notify inviter if they're online
-                            if inviter and inviter in self.clients:
-                                try:
-                                    self.send_json(self.clients[inviter], {
-                                        'type': 'GROUP_INVITE_ACCEPTED',
-                                        'from': from_user,
-                                        'group_name': group_name
-                                    })
-                                except Exception as e:
-                                    print(f"[SERVER] Error notifying inviter: {e}")
-                            
-                            print(f"[SERVER] {from_user} joined group {group_name}")
-                        else:
-                            self.send_json(client_socket, {
-                                'type': 'GROUP_INVITE_ERROR',
-                                'message': 'You are already a member of this group'
-                            })
+                    group = self.groups_db.get(group_name)
+                    if group is None:
+                        error = 'Group no longer exists'
+                    elif self.is_group_member(group_name, from_user):
+                        error = 'You are already a member of this group'
                     else:
-                        self.send_json(client_socket, {
-                            'type': 'GROUP_INVITE_ERROR',
-                            'message': 'Group no longer exists'
+                        group['members'].append(from_user)
+                        self.user_to_groups.setdefault(from_user, set()).add(group_name)
+                
+                if error:
+                    self.send_raw(client_socket, error_frame('GROUP_INVITE_ERROR', error))
+                    return
+                
+                self.schedule_save('groups')
+                
+                # Notify user of successful join
+                self.send_json(client_socket, {
+                    'type': 'GROUP_JOIN_SUCCESS',
+                    'group_name': group_name
+                })
+                
+                # Notify inviter if they're online
+                inviter_socket = self.clients.get(inviter) if inviter else None
+                if inviter_socket is not None:
+                    try:
+                        self.send_json(inviter_socket, {
+                            'type': 'GROUP_INVITE_ACCEPTED',
+                            'from': from_user,
+                            'group_name': group_name
                         })
+                    except Exception as e:
+                        logger.error("Error notifying inviter: %s", e)
+                
+                logger.debug("%s joined group %s", from_user, group_name)
             else:
                 # Notify inviter of decline if they're online
-                if inviter and inviter in self.clients:
+                inviter_socket = self.clients.get(inviter) if inviter else None
+                if inviter_socket is not None:
                     try:
-                        self.send_json(self.clients[inviter], {
+                        self.send_json(inviter_socket, {
                             'type': 'GROUP_INVITE_DECLINED',
                             'from': from_user,
                             'group_name': group_name
                         })
                     except Exception as e:
-                        print(f"[SERVER] Error notifying inviter of decline: {e}")
+                        logger.error("Error notifying inviter of decline: %s", e)
             
         except Exception as e:
-            print(f"[SERVER] Error handling group invite response: {e}")
+            logger.error("Error handling group invite response: %s", e)
 
     def handle_join_group(self, client_socket, message):
         """Handle direct group join request"""
@@ -930,36 +1396,35 @@ class ChatServer:
             group_name = message['group_name']
             username = message['user']
             
-            print(f"[SERVER] Join group request: {username} -> {group_name}")
+            logger.debug("Join group request: %s -> %s", username, group_name)
             
+            error = None
             with self.lock:
-                if group_name not in self.groups_db:
-                    self.send_json(client_socket, {
-                        'type': 'JOIN_GROUP_ERROR',
-                        'message': 'Group does not exist'
-                    })
-                    return
-                
-                if username in self.groups_db[group_name]['members']:
-                    self.send_json(client_socket, {
-                        'type': 'JOIN_GROUP_ERROR',
-                        'message': 'You are already a member of this group'
-                    })
-                    return
-                
-                # Add user to group
-                self.groups_db[group_name]['members'].append(username)
-                self.save_groups()
-                
-                self.send_json(client_socket, {
-                    'type': 'GROUP_JOIN_SUCCESS',
-                    'group_name': group_name
-                })
-                
-                print(f"[SERVER] {username} joined group {group_name}")
+                group = self.groups_db.get(group_name)
+                if group is None:
+                    error = 'Group does not exist'
+                elif self.is_group_member(group_name, username):
+                    error = 'You are already a member of this group'
+                else:
+                    # Add user to group
+                    group['members'].append(username)
+                    self.user_to_groups.setdefault(username, set()).add(group_name)
+            
+            if error:
+                self.send_raw(client_socket, error_frame('JOIN_GROUP_ERROR', error))
+                return
+            
+            self.schedule_save('groups')
+            
+            self.send_json(client_socket, {
+                'type': 'GROUP_JOIN_SUCCESS',
+                'group_name': group_name
+            })
+            
+            logger.debug("%s joined group %s", username, group_name)
                 
         except Exception as e:
-            print(f"[SERVER] Error handling join group: {e}")
+            logger.error("Error handling join group: %s", e)
 
     def handle_leave_group(self, client_socket, message):
         """Handle group leave request"""
@@ -967,46 +1432,45 @@ class ChatServer:
             group_name = message['group_name']
             username = message['user']
             
-            print(f"[SERVER] Leave group request: {username} leaving {group_name}")
+            logger.debug("Leave group request: %s leaving %s", username, group_name)
             
+            error = None
             with self.lock:
-                if group_name not in self.groups_db:
-                    self.send_json(client_socket, {
-                        'type': 'LEAVE_GROUP_ERROR',
-                        'message': 'Group does not exist'
-                    })
-                    return
-                
-                if username not in self.groups_db[group_name]['members']:
-                    self.send_json(client_socket, {
-                        'type': 'LEAVE_GROUP_ERROR',
-                        'message': 'You are not a member of this group'
-                    })
-                    return
-                
-                # Remove user from group
-                self.groups_db[group_name]['members'].remove(username)
-                
-                # If group is empty and user was admin, delete the group
-                if not self.groups_db[group_name]['members']:
-                    del self.groups_db[group_name]
-                    print(f"[SERVER] Group {group_name} deleted (no members left)")
-                elif self.groups_db[group_name]['admin'] == username:
-                    # Transfer admin to first remaining member
-                    self.groups_db[group_name]['admin'] = self.groups_db[group_name]['members'][0]
-                    print(f"[SERVER] Admin of {group_name} transferred to {self.groups_db[group_name]['admin']}")
-                
-                self.save_groups()
-                
-                self.send_json(client_socket, {
-                    'type': 'LEAVE_GROUP_SUCCESS',
-                    'group_name': group_name
-                })
-                
-                print(f"[SERVER] {username} left group {group_name}")
+                group = self.groups_db.get(group_name)
+                if group is None:
+                    error = 'Group does not exist'
+                elif not self.is_group_member(group_name, username):
+                    error = 'You are not a member of this group'
+                else:
+                    # Remove user from group
+                    members = group['members']
+                    members.remove(username)
+                    self.user_to_groups.get(username, set()).discard(group_name)
+                    
+                    # If group is empty and user was admin, delete the group
+                    if not members:
+                        del self.groups_db[group_name]
+                        logger.debug("Group %s deleted (no members left)", group_name)
+                    elif group['admin'] == username:
+                        # Transfer admin to first remaining member
+                        group['admin'] = members[0]
+                        logger.debug("Admin of %s transferred to %s", group_name, group['admin'])
+            
+            if error:
+                self.send_raw(client_socket, error_frame('LEAVE_GROUP_ERROR', error))
+                return
+            
+            self.schedule_save('groups')
+            
+            self.send_json(client_socket, {
+                'type': 'LEAVE_GROUP_SUCCESS',
+                'group_name': group_name
+            })
+            
+            logger.debug("%s left group %s", username, group_name)
                 
         except Exception as e:
-            print(f"[SERVER] Error handling leave group: {e}")
+            logger.error("Error handling leave group: %s", e)
 
     def handle_unfriend(self, client_socket, message):
         """Handle unfriend request"""
@@ -1014,7 +1478,7 @@ class ChatServer:
             from_user = message['from']
             target_user = message['target']
             
-            print(f"[SERVER] Unfriend request: {from_user} unfriending {target_user}")
+            logger.debug("Unfriend request: %s unfriending %s", from_user, target_user)
             
             # Remove bidirectional friendship
             self.remove_friend_relationship(from_user, target_user)
@@ -1026,65 +1490,80 @@ class ChatServer:
             })
             
             # Notify the target user if they're online
-            if target_user in self.clients:
+            target_socket = self.clients.get(target_user)
+            if target_socket is not None:
                 try:
-                    self.send_json(self.clients[target_user], {
+                    self.send_json(target_socket, {
                         'type': 'UNFRIENDED_BY',
                         'unfriended_by': from_user
                     })
-                    print(f"[SERVER] Notified {target_user} of being unfriended by {from_user}")
+                    logger.debug("Notified %s of being unfriended by %s", target_user, from_user)
                 except Exception as e:
-                    print(f"[SERVER] Error notifying {target_user} of unfriend: {e}")
+                    logger.error("Error notifying %s of unfriend: %s", target_user, e)
+                    self.store_offline_message(target_user, {
+                        'type': 'UNFRIENDED_BY',
+                        'from': from_user,
+                        'unfriended_by': from_user
+                    })
+            else:
+                # Store as offline message so their client drops the friend at login
+                self.store_offline_message(target_user, {
+                    'type': 'UNFRIENDED_BY',
+                    'from': from_user,
+                    'unfriended_by': from_user
+                })
             
-            print(f"[SERVER] Unfriend completed: {from_user} <-> {target_user}")
+            logger.debug("Unfriend completed: %s <-> %s", from_user, target_user)
             
         except Exception as e:
-            print(f"[SERVER] Error handling unfriend: {e}")
-            self.send_json(client_socket, {
-                'type': 'UNFRIEND_ERROR',
-                'message': 'Failed to unfriend user'
-            })
+            logger.error("Error handling unfriend: %s", e)
+            self.send_raw(client_socket, error_frame('UNFRIEND_ERROR', 'Failed to unfriend user'))
 
     def handle_get_friend_list(self, client_socket, message):
         """Handle request for friend list"""
         try:
             username = message['username']
-            friends = self.load_friends(username)
+            # Read-only copy from the in-memory cache; unknown users get no cache entry
+            with self.lock:
+                friends = list(self.friends_cache.get(username, ()))
             
             self.send_json(client_socket, {
                 'type': 'FRIEND_LIST_RESPONSE',
-                'friends': list(friends)
+                'friends': friends
             })
             
-            print(f"[SERVER] Sent friend list to {username}: {len(friends)} friends")
+            logger.debug("Sent friend list to %s: %s friends", username, len(friends))
             
         except Exception as e:
-            print(f"[SERVER] Error handling get friend list: {e}")
+            logger.error("Error handling get friend list: %s", e)
 
     def handle_edit_profile(self, client_socket, message):
         """Handle profile edit request"""
         try:
             username = message['name']
-            new_info = message['new_info']
+            new_info = dict(message['new_info'])
+            if 'password' in new_info:
+                new_info.update(hash_password(new_info.pop('password')))
             
             with self.lock:
-                if username in self.users_db:
+                found = username in self.users_db
+                if found:
                     self.users_db[username].update(new_info)
-                    self.save_users()
-                    
-                    self.send_json(client_socket, {
-                        'type': 'EDIT_PROFILE_SUCCESS'
-                    })
-                    
-                    print(f"[SERVER] Profile updated for {username}")
-                else:
-                    self.send_json(client_socket, {
-                        'type': 'EDIT_PROFILE_ERROR',
-                        'message': 'User not found'
-                    })
+                    self.users_version += 1
+            
+            if found:
+                self.schedule_save('users')
+                
+                self.send_json(client_socket, {
+                    'type': 'EDIT_PROFILE_SUCCESS'
+                })
+                
+                logger.debug("Profile updated for %s", username)
+            else:
+                self.send_raw(client_socket, error_frame('EDIT_PROFILE_ERROR', 'User not found'))
             
         except Exception as e:
-            print(f"[SERVER] Error handling profile edit: {e}")
+            logger.error("Error handling profile edit: %s", e)
 
     def start_server(self):
         """Start the chat server"""
@@ -1092,30 +1571,49 @@ class ChatServer:
             server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
             server_socket.bind((HOST, PORT))
-            server_socket.listen(5)
+            server_socket.listen(LISTEN_BACKLOG)
             
-            print(f"[SERVER] Chat server started on {HOST}:{PORT}")
-            print("[SERVER] Waiting for connections...")
+            logger.info("Chat server started on %s:%s", HOST, PORT)
+            logger.info("Waiting for connections...")
             
             while True:
                 try:
                     client_socket, client_address = server_socket.accept()
-                    client_thread = threading.Thread(
-                        target=self.handle_client,
-                        args=(client_socket, client_address),
-                        daemon=True
-                    )
-                    client_thread.start()
+                    # Small chat frames should not wait on Nagle's algorithm
+                    client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                    # Detect peers that vanished without closing, so their handler thread is freed
+                    client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+                    client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_BUFFER_SIZE)
+                    client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFFER_SIZE)
+                    set_send_timeout(client_socket, SEND_TIMEOUT)
+                    # Pool threads are reused across connections and capped at MAX_CLIENTS;
+                    # when every one is busy, say so instead of leaving the client queued
+                    if not self.client_slots.acquire(blocking=False):
+                        logger.warning("Server full, refusing %s", client_address)
+                        try:
+                            client_socket.sendall(b''.join(error_frame('ERROR', 'Server is full, try again later')))
+                        except OSError:
+                            pass
+                        client_socket.close()
+                        continue
+                    self.client_pool.submit(self.handle_client, client_socket, client_address)
                 except Exception as e:
-                    print(f"[SERVER] Error accepting connection: {e}")
+                    logger.error("Error accepting connection: %s", e)
                     
         except Exception as e:
-            print(f"[SERVER] Error starting server: {e}")
+            logger.error("Error starting server: %s", e)
         finally:
             try:
                 server_socket.close()
             except:
                 pass
+            # Unblock the pooled client handlers so the process can exit
+            for sock in list(self.connections):
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except:
+                    pass
+            self.client_pool.shutdown(wait=False)
 
 if __name__ == "__main__":
     print("=== Python Chat Server ===")
@@ -4,30 +4,76 @@ TCP Reno CWND Graphing Module
 Automated real-time graphing of TCP Reno congestion window behavior
 """
 
-import matplotlib.pyplot as plt
 import matplotlib.animation as animation
 from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.lines import Line2D
+from matplotlib.markers import MarkerStyle
+from matplotlib.colors import to_rgba
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import numpy as np
 import threading
+from concurrent.futures import ThreadPoolExecutor
+import atexit
 import time
+import math
 import json
 import os
-from datetime import datetime
 import tkinter as tk
 from tkinter import ttk
 
+# Optional faster JSON encoder for the data file
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+MAX_POINTS = 1000  # most recent data points kept for the graph
+SAVE_INTERVAL = 2.0  # seconds between saves of the data file while recording
+
+# Congestion states are stored as small integer codes so the plot can mask them with NumPy
+STATE_CODES = {'SLOW_START': 0, 'CONGESTION_AVOIDANCE': 1, 'FAST_RECOVERY': 2}
+STATE_NAMES = {code: name for name, code in STATE_CODES.items()}
+UNKNOWN_STATE = -1
+
+# Static exports render off the GUI thread, one at a time
+_export_pool = ThreadPoolExecutor(max_workers=1)
+
+# State code -> (marker, color, size, alpha, legend label)
+STATE_MARKERS = {
+    0: ('^', 'green', 20, 0.6, 'Slow Start'),
+    1: ('s', 'blue', 20, 0.6, 'Congestion Avoidance'),
+    2: ('X', 'red', 30, 0.8, 'Fast Recovery'),
+}
+
+def json_dumps_bytes(obj):
+    """Serialize to UTF-8 JSON bytes, using orjson when installed"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode('utf-8')
+
+def json_loads_bytes(data):
+    """Parse UTF-8 JSON bytes, using orjson when installed"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data.decode('utf-8'))
+
 class TCPRenoGrapher:
     def __init__(self, username="User"):
         self.username = username
         self.data_file = f"reno_graph_data_{username}.json"
         
-        # Graph data storage
-        self.timestamps = []
-        self.cwnd_values = []
-        self.ssthresh_values = []
-        self.states = []
+        # Graph data storage: twice MAX_POINTS long so the newest MAX_POINTS
+        # stay one contiguous slice [_start:_end] and are only moved back when the end is reached
+        self._t_arr = np.empty(2 * MAX_POINTS)
+        self._cwnd_arr = np.empty(2 * MAX_POINTS)
+        self._ssthresh_arr = np.empty(2 * MAX_POINTS)
+        self._states_arr = np.empty(2 * MAX_POINTS, dtype=np.int8)
+        self._start = self._end = 0
+        self._ymax = 0.0  # largest cwnd/ssthresh retained; None until recomputed
         self.events = []  # Special events (Fast Retransmit, Timeout, etc.)
+        self._next_event_id = 0
         
         # Graph window reference
         self.graph_window = None
@@ -35,9 +81,80 @@ class TCPRenoGrapher:
         self.canvas = None
         self.animation = None
         self.is_recording = False
+        self._plot_dirty = True  # new data since the last graph update
+        
+        # Recording only touches memory; a background thread persists the data
+        self._lock = threading.Lock()  # guards the arrays and events
+        self._save_lock = threading.Lock()  # one writer of the data file at a time
+        self._save_event = threading.Event()
+        self._save_dirty = False  # points or events not yet written to the data file
         
         # Load existing data if available
         self.load_data()
+        threading.Thread(target=self._save_loop, daemon=True).start()
+        atexit.register(self.save_data)
+    
+    @property
+    def timestamps(self):
+        return self._t_arr[self._start:self._end]
+    
+    @property
+    def cwnd_values(self):
+        return self._cwnd_arr[self._start:self._end]
+    
+    @property
+    def ssthresh_values(self):
+        return self._ssthresh_arr[self._start:self._end]
+    
+    @property
+    def state_codes(self):
+        return self._states_arr[self._start:self._end]
+    
+    @property
+    def states(self):
+        return [STATE_NAMES.get(code, 'UNKNOWN') for code in self.state_codes.tolist()]
+    
+    def _append_point(self, timestamp, cwnd, ssthresh, state):
+        """Append one point, dropping the oldest beyond MAX_POINTS"""
+        if self._end == len(self._t_arr):
+            count = self._end - self._start
+            for arr in (self._t_arr, self._cwnd_arr, self._ssthresh_arr, self._states_arr):
+                arr[:count] = arr[self._start:self._end]
+            self._start, self._end = 0, count
+        
+        i = self._end
+        self._t_arr[i] = timestamp
+        self._cwnd_arr[i] = cwnd
+        self._ssthresh_arr[i] = ssthresh
+        self._states_arr[i] = STATE_CODES.get(state, UNKNOWN_STATE)
+        self._end += 1
+        if self._ymax is not None:
+            self._ymax = max(self._ymax, cwnd, ssthresh)
+        if self._end - self._start > MAX_POINTS:
+            # Dropping the peak means the maximum has to be recomputed
+            if self._ymax is not None and max(self._cwnd_arr[self._start], self._ssthresh_arr[self._start]) >= self._ymax:
+                self._ymax = None
+            self._start += 1
+            self._drop_old_events()
+    
+    def _drop_old_events(self):
+        """Forget events older than the first retained point so they stay bounded too"""
+        if self._end == self._start:
+            return
+        first_time = self._t_arr[self._start]
+        stale = 0
+        for event in self.events:
+            if event['time'] >= first_time:
+                break
+            stale += 1
+        if stale:
+            del self.events[:stale]
+    
+    def _peak_value(self):
+        """Largest cwnd/ssthresh among the retained points"""
+        if self._ymax is None:
+            self._ymax = float(max(self.cwnd_values.max(), self.ssthresh_values.max()))
+        return self._ymax
         
     def record_data_point(self, cwnd, ssthresh, state, event_type=None):
         """Record a data point for graphing"""
@@ -46,43 +163,54 @@ class TCPRenoGrapher:
             
         current_time = time.time()
         
-        # Store data point
-        self.timestamps.append(current_time)
-        self.cwnd_values.append(cwnd)
-        self.ssthresh_values.append(ssthresh)
-        self.states.append(state)
-        
-        # Record special events
-        if event_type:
-            self.events.append({
-                'time': current_time,
-                'cwnd': cwnd,
-                'event': event_type
-            })
+        with self._lock:
+            # Store data point
+            self._append_point(current_time, cwnd, ssthresh, state)
+            
+            # Record special events
+            if event_type:
+                self.events.append({
+                    'time': current_time,
+                    'cwnd': cwnd,
+                    'event': event_type,
+                    'id': self._next_event_id
+                })
+                self._next_event_id += 1
+            self._save_dirty = True
         
         # Save data to file for persistence
-        self.save_data()
-        
-        # Limit data points to prevent memory issues (keep last 1000 points)
-        if len(self.timestamps) > 1000:
-            self.timestamps = self.timestamps[-1000:]
-            self.cwnd_values = self.cwnd_values[-1000:]
-            self.ssthresh_values = self.ssthresh_values[-1000:]
-            self.states = self.states[-1000:]
+        self._plot_dirty = True
+        self._save_event.set()
+    
+    def _save_loop(self):
+        """Coalesce saves so the data file is written at most once per SAVE_INTERVAL"""
+        while True:
+            self._save_event.wait()
+            time.sleep(SAVE_INTERVAL)
+            self._save_event.clear()
+            self.save_data()
     
     def save_data(self):
         """Save graph data to file"""
         try:
-            data = {
-                'timestamps': self.timestamps,
-                'cwnd_values': self.cwnd_values,
-                'ssthresh_values': self.ssthresh_values,
-                'states': self.states,
-                'events': self.events,
-                'last_updated': datetime.now().isoformat()
-            }
-            with open(self.data_file, 'w') as f:
-                json.dump(data, f)
+            with self._save_lock:
+                with self._lock:
+                    if not self._save_dirty:
+                        return
+                    self._save_dirty = False
+                    data = {
+                        'timestamps': self.timestamps.tolist(),
+                        'cwnd_values': self.cwnd_values.tolist(),
+                        'ssthresh_values': self.ssthresh_values.tolist(),
+                        'states': self.states,
+                        'events': list(self.events),
+                        'last_updated': time.time()
+                    }
+                # Write a temp file and swap it in so a crash never leaves a truncated file
+                tmp_path = self.data_file + '.tmp'
+                with open(tmp_path, 'wb') as f:
+                    f.write(json_dumps_bytes(data))
+                os.replace(tmp_path, self.data_file)
         except Exception:
             pass  # Fail silently
     
@@ -90,24 +218,30 @@ class TCPRenoGrapher:
         """Load existing graph data"""
         try:
             if os.path.exists(self.data_file):
-                with open(self.data_file, 'r') as f:
-                    data = json.load(f)
-                    self.timestamps = data.get('timestamps', [])
-                    self.cwnd_values = data.get('cwnd_values', [])
-                    self.ssthresh_values = data.get('ssthresh_values', [])
-                    self.states = data.get('states', [])
-                    self.events = data.get('events', [])
+                with open(self.data_file, 'rb') as f:
+                    data = json_loads_bytes(f.read())
+                # Only the newest MAX_POINTS points are kept
+                points = zip(*(data.get(key, [])[-MAX_POINTS:] for key in
+                               ('timestamps', 'cwnd_values', 'ssthresh_values', 'states')))
+                for point in points:
+                    self._append_point(*point)
+                self.events = data.get('events', [])
+                self._drop_old_events()
+                for event in self.events:
+                    event['id'] = self._next_event_id
+                    self._next_event_id += 1
         except Exception:
             # If loading fails, start fresh
             self.clear_data()
     
     def clear_data(self):
         """Clear all graph data"""
-        self.timestamps = []
-        self.cwnd_values = []
-        self.ssthresh_values = []
-        self.states = []
-        self.events = []
+        with self._lock:
+            self._start = self._end = 0
+            self._ymax = 0.0
+            self.events = []
+            self._save_dirty = False
+        self._plot_dirty = True
         try:
             if os.path.exists(self.data_file):
                 os.remove(self.data_file)
@@ -122,6 +256,7 @@ class TCPRenoGrapher:
     def stop_recording(self):
         """Stop recording data points"""
         self.is_recording = False
+        self.save_data()
         print(f"[GRAPH-{self.username}] 📊 Stopped recording CWND data")
     
     def show_realtime_graph(self, master_window=None):
@@ -197,9 +332,12 @@ class TCPRenoGrapher:
         self.canvas = FigureCanvasTkAgg(self.figure, main_frame)
         self.canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
         
+        # Create the plot artists once; each frame only updates their data
+        self._init_artists()
+        
         # Start animation
         self.animation = animation.FuncAnimation(
-            self.figure, self._update_graph, interval=1000, blit=False
+            self.figure, self._update_graph, interval=250, blit=True, cache_frame_data=False
         )
         
         # Handle window close
@@ -216,143 +354,212 @@ class TCPRenoGrapher:
         
         return self.graph_window
     
+    def _init_artists(self):
+        """Create the persistent artists that _update_graph refreshes"""
+        ax = self.ax
+        self.cwnd_line, = ax.plot([], [], 'b-', linewidth=2,
+                                  label='CWND (Congestion Window)', marker='o', markersize=3)
+        self.ssthresh_line, = ax.plot([], [], 'r--', linewidth=2,
+                                      label='SSTHRESH (Slow Start Threshold)', alpha=0.7)
+        
+        # State-specific markers share one collection; shape, color and size
+        # are picked per point by indexing these tables with the state codes
+        self.state_scatter = ax.scatter([], [])
+        self._marker_paths = np.empty(len(STATE_MARKERS), dtype=object)
+        self._marker_colors = np.empty((len(STATE_MARKERS), 4))
+        self._marker_sizes = np.empty(len(STATE_MARKERS))
+        legend_handles = [self.cwnd_line, self.ssthresh_line]
+        for code, (marker, color, size, alpha, label) in STATE_MARKERS.items():
+            style = MarkerStyle(marker)
+            self._marker_paths[code] = style.get_path().transformed(style.get_transform())
+            self._marker_colors[code] = to_rgba(color, alpha)
+            self._marker_sizes[code] = size
+            legend_handles.append(Line2D([], [], linestyle='', marker=marker, color=color,
+                                         alpha=alpha, label=label))
+        self.event_annotations = {}  # event id -> (event, Annotation)
+        self._last_annotated_id = -1
+        self._annotation_start = None
+        self._plot_dirty = True
+        
+        # Statistics text box
+        self.stats_text = ax.text(0.02, 0.98, '', transform=ax.transAxes,
+                                  fontsize=10, verticalalignment='top',
+                                  bbox=dict(boxstyle='round', facecolor='wheat', alpha=0.8))
+        
+        # Formatting
+        ax.set_xlabel('Time (seconds)', fontsize=12, fontweight='bold')
+        ax.set_ylabel('Window Size (packets)', fontsize=12, fontweight='bold')
+        ax.set_title('TCP Reno Congestion Control Algorithm\nCongestion Window vs Time', 
+                     fontsize=14, fontweight='bold')
+        ax.grid(True, alpha=0.3)
+        ax.legend(handles=legend_handles, loc='upper left', fontsize=10)
+    
     def _update_graph(self, frame):
-        """Update the graph with current data"""
-        if not self.timestamps or len(self.timestamps) == 0:
-            return
+        """Update the graph artists with current data"""
+        # Idle frames just redraw the existing artists
+        if not self._plot_dirty:
+            return self._artists
+        self._plot_dirty = False
         
-        # Clear previous plot
-        self.ax.clear()
+        timestamps = self.timestamps
+        cwnd_values = self.cwnd_values
+        ssthresh_values = self.ssthresh_values
+        has_data = len(timestamps) > 0
         
         # Convert timestamps to relative time (seconds from start)
-        if len(self.timestamps) > 0:
-            start_time = self.timestamps[0]
-            relative_times = [(t - start_time) for t in self.timestamps]
+        start_time = timestamps[0] if has_data else 0
+        relative_times = timestamps - start_time
+        
+        state_codes = self.state_codes
+        
+        # More than two points per pixel column cannot be told apart; thin them out,
+        # striding back from the newest point so it is always drawn
+        target = max(500, 2 * int(self.ax.bbox.width))
+        step = -(-len(timestamps) // target) or 1
+        plot_times = relative_times[::-step][::-1]
+        plot_cwnd = cwnd_values[::-step][::-1]
+        plot_ssthresh = ssthresh_values[::-step][::-1]
+        plot_states = state_codes[::-step][::-1]
+        
+        # Plot CWND and SSTHRESH
+        self.cwnd_line.set_data(plot_times, plot_cwnd)
+        self.ssthresh_line.set_data(plot_times, plot_ssthresh)
+        
+        # Mark different states with colors
+        known = plot_states != UNKNOWN_STATE
+        codes = plot_states[known]
+        self.state_scatter.set_offsets(np.column_stack((plot_times[known], plot_cwnd[known])))
+        self.state_scatter.set_paths(self._marker_paths[codes].tolist())
+        self.state_scatter.set_facecolors(self._marker_colors[codes])
+        self.state_scatter.set_edgecolors(self._marker_colors[codes])
+        self.state_scatter.set_sizes(self._marker_sizes[codes])
+        
+        # Mark special events
+        self._update_event_annotations(start_time, has_data)
+        
+        # Update statistics text box
+        if has_data:
+            current_state = STATE_NAMES.get(int(state_codes[-1]), "Unknown")
+            self.stats_text.set_text(
+                f'Current CWND: {cwnd_values[-1]:.1f}\n'
+                f'Current SSTHRESH: {ssthresh_values[-1]:.1f}\n'
+                f'Current State: {current_state}\n'
+                f'Data Points: {len(cwnd_values)}\n'
+                f'Events: {len(self.events)}')
         else:
-            relative_times = []
-        
-        # Plot CWND
-        if len(relative_times) > 0:
-            self.ax.plot(relative_times, self.cwnd_values, 'b-', linewidth=2, 
-                        label='CWND (Congestion Window)', marker='o', markersize=3)
-            
-            # Plot SSTHRESH
-            self.ax.plot(relative_times, self.ssthresh_values, 'r--', linewidth=2,
-                        label='SSTHRESH (Slow Start Threshold)', alpha=0.7)
-            
-            # Mark different states with colors
-            slow_start_times = []
-            slow_start_cwnd = []
-            congestion_avoid_times = []
-            congestion_avoid_cwnd = []
-            fast_recovery_times = []
-            fast_recovery_cwnd = []
-            
-            for i, (time, cwnd, state) in enumerate(zip(relative_times, self.cwnd_values, self.states)):
-                if state == "SLOW_START":
-                    slow_start_times.append(time)
-                    slow_start_cwnd.append(cwnd)
-                elif state == "CONGESTION_AVOIDANCE":
-                    congestion_avoid_times.append(time)
-                    congestion_avoid_cwnd.append(cwnd)
-                elif state == "FAST_RECOVERY":
-                    fast_recovery_times.append(time)
-                    fast_recovery_cwnd.append(cwnd)
-            
-            # Plot state-specific points
-            if slow_start_times:
-                self.ax.scatter(slow_start_times, slow_start_cwnd, c='green', s=20, 
-                               alpha=0.6, label='Slow Start', marker='^')
-            if congestion_avoid_times:
-                self.ax.scatter(congestion_avoid_times, congestion_avoid_cwnd, c='blue', s=20,
-                               alpha=0.6, label='Congestion Avoidance', marker='s')
-            if fast_recovery_times:
-                self.ax.scatter(fast_recovery_times, fast_recovery_cwnd, c='red', s=30,
-                               alpha=0.8, label='Fast Recovery', marker='X')
-            
-            # Mark special events
-            for event in self.events:
+            self.stats_text.set_text('')
+        
+        # Axis limits only change occasionally; the ticks then need a full redraw
+        if has_data:
+            # Round the time span up to its leading digit so xlim moves in steps
+            span = relative_times[-1]
+            step = 10 ** math.floor(math.log10(span)) if span > 0 else 1
+            xmax = (math.floor(span / step) + 1) * step
+            ymax = self._peak_value() * 1.1
+        else:
+            xmax, ymax = 10, 1
+        if self.ax.get_xlim() != (0, xmax) or self.ax.get_ylim() != (0, ymax):
+            self.ax.set_xlim(0, xmax)
+            self.ax.set_ylim(0, ymax)
+            if self.canvas:
+                self.canvas.draw()
+        
+        self._artists = (self.cwnd_line, self.ssthresh_line, self.state_scatter,
+                         self.stats_text, *(annotation for _, annotation in self.event_annotations.values()))
+        return self._artists
+    
+    def _update_event_annotations(self, start_time, has_data):
+        """Annotate only new events, dropping those older than the first retained point"""
+        annotations = self.event_annotations
+        
+        # Annotations are kept in event order, so expired ones are at the front
+        while annotations:
+            event_id, (event, annotation) = next(iter(annotations.items()))
+            if has_data and event['time'] >= start_time:
+                break
+            annotation.remove()
+            del annotations[event_id]
+        
+        # Relative times shift once old points are dropped
+        if start_time != self._annotation_start:
+            self._annotation_start = start_time
+            for event, annotation in annotations.values():
                 event_time = event['time'] - start_time
-                event_cwnd = event['cwnd']
-                event_type = event['event']
-                
-                if event_time >= min(relative_times) and event_time <= max(relative_times):
-                    if 'fast_retransmit' in event_type.lower():
-                        self.ax.annotate('Fast Retransmit', xy=(event_time, event_cwnd),
-                                        xytext=(event_time, event_cwnd + 2), 
-                                        arrowprops=dict(arrowstyle='->', color='red'),
-                                        fontsize=8, color='red', weight='bold')
-                    elif 'timeout' in event_type.lower():
-                        self.ax.annotate('Timeout', xy=(event_time, event_cwnd),
-                                        xytext=(event_time, event_cwnd + 2),
-                                        arrowprops=dict(arrowstyle='->', color='orange'),
-                                        fontsize=8, color='orange', weight='bold')
+                annotation.xy = (event_time, event['cwnd'])
+                annotation.set_position((event_time, event['cwnd'] + 2))
         
-        # Formatting
-        self.ax.set_xlabel('Time (seconds)', fontsize=12, fontweight='bold')
-        self.ax.set_ylabel('Window Size (packets)', fontsize=12, fontweight='bold')
-        self.ax.set_title('TCP Reno Congestion Control Algorithm\nCongestion Window vs Time', 
-                         fontsize=14, fontweight='bold')
-        self.ax.grid(True, alpha=0.3)
-        self.ax.legend(loc='upper left', fontsize=10)
-        
-        # Set reasonable y-axis limits
-        if self.cwnd_values:
-            max_val = max(max(self.cwnd_values), max(self.ssthresh_values))
-            self.ax.set_ylim(0, max_val * 1.1)
-        
-        # Add statistics text box
-        if len(self.cwnd_values) > 0:
-            current_cwnd = self.cwnd_values[-1]
-            current_ssthresh = self.ssthresh_values[-1]
-            current_state = self.states[-1] if self.states else "Unknown"
-            
-            stats_text = f'Current CWND: {current_cwnd:.1f}\n'
-            stats_text += f'Current SSTHRESH: {current_ssthresh:.1f}\n'
-            stats_text += f'Current State: {current_state}\n'
-            stats_text += f'Data Points: {len(self.cwnd_values)}\n'
-            stats_text += f'Events: {len(self.events)}'
-            
-            self.ax.text(0.02, 0.98, stats_text, transform=self.ax.transAxes,
-                        fontsize=10, verticalalignment='top',
-                        bbox=dict(boxstyle='round', facecolor='wheat', alpha=0.8))
+        new_events = []
+        for event in reversed(self.events):
+            if event['id'] <= self._last_annotated_id:
+                break
+            new_events.append(event)
         
-        # Refresh canvas
-        if self.canvas:
-            self.canvas.draw()
+        for event in reversed(new_events):
+            self._last_annotated_id = event['id']
+            event_time = event['time'] - start_time
+            event_cwnd = event['cwnd']
+            event_type = event['event'].lower()
+            
+            if not has_data or event_time < 0:
+                continue
+            if 'fast_retransmit' in event_type:
+                label, color = 'Fast Retransmit', 'red'
+            elif 'timeout' in event_type:
+                label, color = 'Timeout', 'orange'
+            else:
+                continue
+            annotations[event['id']] = (event, self.ax.annotate(
+                label, xy=(event_time, event_cwnd), xytext=(event_time, event_cwnd + 2),
+                arrowprops=dict(arrowstyle='->', color=color),
+                fontsize=8, color=color, weight='bold', animated=True))
     
-    def generate_static_graph(self, save_path=None):
-        """Generate and save a static graph image"""
-        if not self.timestamps:
+    def generate_static_graph(self, save_path=None, background=False):
+        """Generate and save a static graph image; with background=True returns a Future"""
+        if background:
+            return _export_pool.submit(self.generate_static_graph, save_path)
+        
+        # Snapshot the data so recording can continue while rendering
+        with self._lock:
+            timestamps = self.timestamps.copy()
+            cwnd_values = self.cwnd_values.copy()
+            ssthresh_values = self.ssthresh_values.copy()
+            events = list(self.events)
+        
+        if not len(timestamps):
             print("No data available for graph generation")
             return None
         
-        # Create figure
-        fig = plt.figure(figsize=(12, 8), dpi=150)
+        # Create figure on the Agg canvas directly, without pyplot's global state
+        fig = Figure(figsize=(12, 8), dpi=150)
+        FigureCanvasAgg(fig)
         ax = fig.add_subplot(111)
         
         # Convert timestamps to relative time
-        start_time = self.timestamps[0]
-        relative_times = [(t - start_time) for t in self.timestamps]
+        start_time = timestamps[0]
+        relative_times = timestamps - start_time
         
         # Plot data
-        ax.plot(relative_times, self.cwnd_values, 'b-', linewidth=2, 
+        ax.plot(relative_times, cwnd_values, 'b-', linewidth=2, 
                label='CWND (Congestion Window)', marker='o', markersize=3)
-        ax.plot(relative_times, self.ssthresh_values, 'r--', linewidth=2,
+        ax.plot(relative_times, ssthresh_values, 'r--', linewidth=2,
                label='SSTHRESH (Slow Start Threshold)', alpha=0.7)
         
         # Mark events
-        for event in self.events:
+        labelled = set()
+        for event in events:
             event_time = event['time'] - start_time
             event_cwnd = event['cwnd']
             event_type = event['event']
             
             if 'fast_retransmit' in event_type.lower():
-                ax.scatter([event_time], [event_cwnd], c='red', s=100, marker='X', 
-                          label='Fast Retransmit' if 'Fast Retransmit' not in [h.get_label() for h in ax.get_children()] else "")
+                label, color, marker = 'Fast Retransmit', 'red', 'X'
             elif 'timeout' in event_type.lower():
-                ax.scatter([event_time], [event_cwnd], c='orange', s=100, marker='v',
-                          label='Timeout' if 'Timeout' not in [h.get_label() for h in ax.get_children()] else "")
+                label, color, marker = 'Timeout', 'orange', 'v'
+            else:
+                continue
+            ax.scatter([event_time], [event_cwnd], c=color, s=100, marker=marker,
+                      label=label if label not in labelled else "")
+            labelled.add(label)
         
         # Formatting
         ax.set_xlabel('Time (seconds)', fontsize=12, fontweight='bold')
@@ -371,49 +578,55 @@ class TCPRenoGrapher:
             fig.savefig(save_path, dpi=150, bbox_inches='tight')
             print(f"Graph saved to: {save_path}")
         
-        plt.close(fig)
         return save_path
 
-# Global grapher instance
-_grapher_instance = None
+# Grapher instances, one per user
+_graphers = {}
 
 def get_grapher(username="User"):
-    """Get or create grapher instance"""
-    global _grapher_instance
-    if _grapher_instance is None:
-        _grapher_instance = TCPRenoGrapher(username)
-    return _grapher_instance
+    """Get or create the grapher for a user"""
+    grapher = _graphers.get(username)
+    if grapher is None:
+        grapher = _graphers[username] = TCPRenoGrapher(username)
+    return grapher
 
-def record_cwnd_point(cwnd, ssthresh, state, event_type=None):
+def record_cwnd_point(cwnd, ssthresh, state, event_type=None, username="User"):
     """Record a data point for graphing"""
-    if _grapher_instance:
-        _grapher_instance.record_data_point(cwnd, ssthresh, state, event_type)
+    grapher = _graphers.get(username)
+    if grapher:
+        grapher.record_data_point(cwnd, ssthresh, state, event_type)
 
-def show_graph(master_window=None):
+def show_graph(master_window=None, username="User"):
     """Show real-time graph window"""
-    if _grapher_instance:
-        return _grapher_instance.show_realtime_graph(master_window)
+    grapher = _graphers.get(username)
+    if grapher:
+        return grapher.show_realtime_graph(master_window)
     return None
 
-def start_graph_recording():
+def start_graph_recording(username="User"):
     """Start recording graph data"""
-    if _grapher_instance:
-        _grapher_instance.start_recording()
+    grapher = _graphers.get(username)
+    if grapher:
+        grapher.start_recording()
 
-def stop_graph_recording():
+def stop_graph_recording(username="User"):
     """Stop recording graph data"""
-    if _grapher_instance:
-        _grapher_instance.stop_recording()
+    grapher = _graphers.get(username)
+    if grapher:
+        grapher.stop_recording()
 
-def clear_graph_data():
+def clear_graph_data(username="User"):
     """Clear all graph data"""
-    if _grapher_instance:
-        _grapher_instance.clear_data()
+    grapher = _graphers.get(username)
+    if grapher:
+        grapher.clear_data()
 
-def save_graph(save_path=None):
-    """Save current graph as image"""
-    if _grapher_instance:
-        return _grapher_instance.generate_static_graph(save_path)
+def save_graph(save_path=None, username="User", background=True):
+    """Save current graph as image; rendered on the export thread unless background=False,
+    in which case the saved path is returned instead of a Future"""
+    grapher = _graphers.get(username)
+    if grapher:
+        return grapher.generate_static_graph(save_path, background)
     return None
 
 if __name__ == "__main__":
@@ -4,26 +4,63 @@ TCP Reno Algorithm Implementation for Chat Application
 Complete implementation of TCP Reno congestion control with Fast Recovery
 """
 
-import random
-import time
+import bisect
+import logging
+from enum import IntEnum
+import numpy as np
+
+__all__ = ['RenoState', 'TCPRenoController', 'initialize_reno', 'simulate_reno_transmission',
+           'get_reno_stats', 'toggle_reno', 'reset_reno_stats', 'show_reno_graph',
+           'start_graph_recording', 'stop_graph_recording', 'save_reno_graph']
+
+# Per-packet trace; the per-transmission summary still goes to stdout
+log = logging.getLogger('tcp_reno')
+
+# Simulated network conditions by payload size: sizes above LOSS_THRESHOLDS[i]
+# get LOSS_LEVELS[i + 1] as (loss rate, congestion level)
+LOSS_THRESHOLDS = (500, 1000, 2000)
+LOSS_LEVELS = ((0.02, "LOW"), (0.05, "MEDIUM"), (0.08, "HIGH"), (0.12, "SEVERE"))
+
+# Small cwnd changes are only sent to the graph once they add up or after this many ACKs
+RECORD_MIN_CHANGE = 0.5
+RECORD_EVERY_ACKS = 16
 
 # Import graphing module for automated CWND graphing
 try:
-    from tcp_reno_graph import record_cwnd_point
+    from tcp_reno_graph import (record_cwnd_point, get_grapher, show_graph, save_graph,
+                                start_graph_recording as _start_recording,
+                                stop_graph_recording as _stop_recording)
     GRAPH_AVAILABLE = True
 except ImportError:
     GRAPH_AVAILABLE = False
     def record_cwnd_point(*args, **kwargs):
         pass  # No-op if graphing not available
 
+class RenoState(IntEnum):
+    """Congestion control phase; the value indexes the ACK handler table"""
+    SLOW_START = 0
+    CONGESTION_AVOIDANCE = 1
+    FAST_RECOVERY = 2
+
+def _measure(data):
+    """Payload size without re-stringifying str/bytes payloads"""
+    if isinstance(data, (str, bytes, bytearray, memoryview)):
+        return len(data)
+    return len(str(data))
+
 class TCPRenoController:
-    def __init__(self, username="User"):
+    __slots__ = ('username', 'cwnd', 'ssthresh', 'state', 'duplicate_acks', 'last_ack', 'high_seq',
+                 'packets_sent', 'retransmissions', 'fast_retransmits', 'timeouts', 'enabled',
+                 'base_loss_rate', 'current_loss_rate', '_last_recorded_cwnd', '_acks_since_record',
+                 '_ack_handlers', '_rng')
+    
+    def __init__(self, username="User", seed=None):
         self.username = username
         
         # TCP Reno state variables
         self.cwnd = 1.0          # Congestion window (MSS units)
         self.ssthresh = 64.0     # Slow start threshold
-        self.state = "SLOW_START"
+        self.state = RenoState.SLOW_START
         
         # Fast retransmit/recovery variables
         self.duplicate_acks = 0
@@ -40,13 +77,22 @@ class TCPRenoController:
         # Network simulation
         self.base_loss_rate = 0.02
         self.current_loss_rate = 0.02
+        self._rng = np.random.default_rng(seed)  # Own stream so a seed replays a run exactly
+        
+        # Graph recording throttle
+        self._last_recorded_cwnd = self.cwnd
+        self._acks_since_record = 0
+        
+        # New-ACK handlers indexed by RenoState
+        self._ack_handlers = (self._ack_slow_start, self._ack_congestion_avoidance, self._ack_fast_recovery)
         
     def simulate_reno_transmission(self, data, data_type="message"):
         """Simulate TCP Reno transmission with full algorithm"""
-        if not self.enabled:
+        # Under python -O the simulator is compiled out: __debug__ is a constant False
+        if not __debug__ or not self.enabled:
             return True
             
-        data_size = len(str(data))
+        data_size = _measure(data)
         
         # Adjust network conditions based on data size
         self._adjust_network_conditions(data_size)
@@ -56,63 +102,87 @@ class TCPRenoController:
         total_packets = max(1, (data_size + mss - 1) // mss)
         
         print(f"[RENO-{self.username}] 🚀 {data_type.upper()}: {data_size}B → {total_packets} packets")
-        print(f"[RENO-{self.username}] 📊 Initial: CWND={self.cwnd:.1f}, SSTHRESH={self.ssthresh:.1f}, STATE={self.state}")
+        print(f"[RENO-{self.username}] 📊 Initial: CWND={self.cwnd:.1f}, SSTHRESH={self.ssthresh:.1f}, STATE={self.state.name}")
         
         # Record initial state for graph
-        record_cwnd_point(self.cwnd, self.ssthresh, self.state)
+        self._record_point()
+        
+        # Draw every random outcome for the transmission in one go; the state machine
+        # below is inherently sequential, so only these per-packet draws are vectorised
+        draws = self._rng.random((total_packets, 4))
+        window_acks = (draws[:, 0] < 0.7).tolist()  # 70% chance a waited-for ACK arrives
+        losses = (draws[:, 1] < self.current_loss_rate).tolist()
+        timeouts = (draws[:, 2] < 0.3).tolist()
+        acks = (draws[:, 3] < 0.8).tolist()
         
         # Simulate packet-by-packet transmission with Reno algorithm
         packets_acked = 0
+        packets_sent = 0
         consecutive_losses = 0
+        debug = log.isEnabledFor(logging.DEBUG)
+        
+        # Loop-invariant lookups bound to locals; window is refreshed whenever cwnd changes
+        user = self.username
+        process_ack = self._process_ack
+        congestion_event = self._apply_congestion_event
+        window = int(self.cwnd)
         
         for seq_num in range(total_packets):
-            self.high_seq = seq_num
-            
             # Check if we can send (congestion window constraint)
-            window_full = (seq_num - packets_acked) >= int(self.cwnd)
-            if window_full:
-                print(f"[RENO-{self.username}] ⏸️  Window full (outstanding: {seq_num - packets_acked}, cwnd: {int(self.cwnd)})")
+            if seq_num - packets_acked >= window:
+                if debug:
+                    log.debug("[RENO-%s] ⏸️  Window full (outstanding: %d, cwnd: %d)",
+                              user, seq_num - packets_acked, window)
                 # Simulate waiting for ACKs to open window
-                if random.random() < 0.7:  # 70% chance ACK arrives
+                if window_acks[seq_num]:
                     packets_acked += 1
-                    self._process_ack(packets_acked - 1, is_new_ack=True)
+                    window = int(process_ack(packets_acked - 1, is_new_ack=True))
             
             # Simulate packet transmission
-            if self._simulate_packet_loss():
+            if losses[seq_num]:
                 # Packet lost
-                print(f"[RENO-{self.username}] 💥 Packet {seq_num} LOST")
+                if debug:
+                    log.debug("[RENO-%s] 💥 Packet %d LOST", user, seq_num)
                 consecutive_losses += 1
                 
                 if consecutive_losses >= 3:
                     # Simulate 3 duplicate ACKs → Fast Retransmit
-                    print(f"[RENO-{self.username}] ⚡ 3 Duplicate ACKs → Fast Retransmit")
-                    self._handle_fast_retransmit()
+                    if debug:
+                        log.debug("[RENO-%s] ⚡ 3 Duplicate ACKs → Fast Retransmit", user)
+                    congestion_event("fast_retransmit")
+                    window = int(self.cwnd)
                     consecutive_losses = 0
-                elif consecutive_losses >= 1 and random.random() < 0.3:
+                elif timeouts[seq_num]:
                     # Simulate timeout
-                    print(f"[RENO-{self.username}] ⏰ Timeout → Slow Start")
-                    self._handle_timeout()
+                    if debug:
+                        log.debug("[RENO-%s] ⏰ Timeout → Slow Start", user)
+                    congestion_event("timeout")
+                    window = int(self.cwnd)
                     consecutive_losses = 0
             else:
                 # Packet successfully transmitted
                 consecutive_losses = 0
-                self.packets_sent += 1
+                packets_sent += 1
                 
                 # Simulate ACK reception (80% success rate)
-                if random.random() < 0.8:
+                if acks[seq_num]:
                     packets_acked += 1
-                    is_new_ack = seq_num >= self.last_ack
-                    self._process_ack(seq_num, is_new_ack)
-                    print(f"[RENO-{self.username}] ✅ ACK {seq_num} → CWND={self.cwnd:.1f}")
-                else:
-                    print(f"[RENO-{self.username}] ⏳ ACK {seq_num} delayed/lost")
+                    cwnd = process_ack(seq_num, seq_num >= self.last_ack)
+                    window = int(cwnd)
+                    if debug:
+                        log.debug("[RENO-%s] ✅ ACK %d → CWND=%.1f", user, seq_num, cwnd)
+                elif debug:
+                    log.debug("[RENO-%s] ⏳ ACK %d delayed/lost", user, seq_num)
+        
+        self.high_seq = total_packets - 1
+        self.packets_sent += packets_sent
         
         # Final statistics
         efficiency = (packets_acked / total_packets) * 100 if total_packets > 0 else 100
         print(f"[RENO-{self.username}] 🎯 === TCP RENO COMPLETE ===")
         print(f"[RENO-{self.username}] 📈 Efficiency: {efficiency:.0f}%")
         print(f"[RENO-{self.username}] 📊 Final CWND: {self.cwnd:.1f}")
-        print(f"[RENO-{self.username}] 🏁 Final State: {self.state}")
+        print(f"[RENO-{self.username}] 🏁 Final State: {self.state.name}")
         print(f"[RENO-{self.username}] 🔄 Fast Retransmits: {self.fast_retransmits}")
         print(f"[RENO-{self.username}] ⏰ Timeouts: {self.timeouts}")
         print(f"[RENO-{self.username}] ================================")
@@ -120,7 +190,7 @@ class TCPRenoController:
         return True
     
     def _process_ack(self, ack_seq, is_new_ack):
-        """Process ACK according to TCP Reno algorithm"""
+        """Process ACK according to TCP Reno algorithm; returns the new cwnd"""
         old_cwnd = self.cwnd
         old_state = self.state
         
@@ -128,112 +198,79 @@ class TCPRenoController:
             # New ACK received
             self.duplicate_acks = 0
             self.last_ack = ack_seq
-            
-            if self.state == "SLOW_START":
-                # Slow Start: cwnd += 1 for each ACK (exponential growth)
-                self.cwnd += 1
-                
-                # Transition to Congestion Avoidance when cwnd >= ssthresh
-                if self.cwnd >= self.ssthresh:
-                    self.state = "CONGESTION_AVOIDANCE"
-                    print(f"[RENO-{self.username}] 🚦 SLOW_START → CONGESTION_AVOIDANCE (cwnd={self.cwnd:.1f})")
-                
-            elif self.state == "CONGESTION_AVOIDANCE":
-                # Congestion Avoidance: cwnd += 1/cwnd for each ACK (linear growth)
-                self.cwnd += 1.0 / self.cwnd
-                
-            elif self.state == "FAST_RECOVERY":
-                # Fast Recovery: exit when new ACK received
-                self.cwnd = self.ssthresh
-                self.state = "CONGESTION_AVOIDANCE"
-                print(f"[RENO-{self.username}] 🏃 FAST_RECOVERY → CONGESTION_AVOIDANCE (cwnd={self.cwnd:.1f})")
+            self._ack_handlers[self.state]()
         else:
             # Duplicate ACK
             self.duplicate_acks += 1
             
-            if self.duplicate_acks == 3 and self.state != "FAST_RECOVERY":
+            if self.duplicate_acks == 3 and self.state != RenoState.FAST_RECOVERY:
                 # Triple duplicate ACK → Fast Retransmit
-                self._handle_fast_retransmit()
-            elif self.state == "FAST_RECOVERY":
+                self._apply_congestion_event("fast_retransmit")
+            elif self.state == RenoState.FAST_RECOVERY:
                 # In Fast Recovery: inflate window for each additional duplicate ACK
                 self.cwnd += 1
-                print(f"[RENO-{self.username}] 🎈 Fast Recovery window inflation → CWND={self.cwnd:.1f}")
-        
-        # Record CWND change for graph if significant change occurred
-        if abs(self.cwnd - old_cwnd) > 0.01 or self.state != old_state:
-            record_cwnd_point(self.cwnd, self.ssthresh, self.state)
-    
-    def _handle_fast_retransmit(self):
-        """Handle Fast Retransmit and enter Fast Recovery (TCP Reno)"""
-        print(f"[RENO-{self.username}] ⚡ === FAST RETRANSMIT TRIGGERED ===")
-        
-        # 1. Set ssthresh = cwnd / 2
-        self.ssthresh = max(self.cwnd / 2, 2)
-        
-        # 2. Set cwnd = ssthresh + 3 (for the 3 duplicate ACKs)
-        self.cwnd = self.ssthresh + 3
-        
-        # 3. Enter Fast Recovery state
-        self.state = "FAST_RECOVERY"
+                log.debug("[RENO-%s] 🎈 Fast Recovery window inflation → CWND=%.1f", self.username, self.cwnd)
         
-        # 4. Retransmit the lost packet
-        self.fast_retransmits += 1
-        self.retransmissions += 1
-        
-        print(f"[RENO-{self.username}] 📉 SSTHRESH: {self.ssthresh:.1f}")
-        print(f"[RENO-{self.username}] 📊 CWND: {self.cwnd:.1f} (ssthresh + 3)")
-        print(f"[RENO-{self.username}] 🏃 STATE: FAST_RECOVERY")
-        print(f"[RENO-{self.username}] 🔄 Retransmitting lost packet")
+        # Record CWND change for graph; state changes always, small drifts once they add up
+        self._acks_since_record += 1
+        if self.state != old_state or (abs(self.cwnd - old_cwnd) > 0.01 and (
+                abs(self.cwnd - self._last_recorded_cwnd) > RECORD_MIN_CHANGE
+                or self._acks_since_record >= RECORD_EVERY_ACKS)):
+            self._record_point()
         
-        # Record fast retransmit event for graph
-        record_cwnd_point(self.cwnd, self.ssthresh, self.state, "fast_retransmit")
+        return self.cwnd
     
-    def _handle_timeout(self):
-        """Handle timeout (severe congestion)"""
-        print(f"[RENO-{self.username}] ⏰ === TIMEOUT OCCURRED ===")
+    def _ack_slow_start(self):
+        """Slow Start: cwnd += 1 for each ACK (exponential growth)"""
+        self.cwnd += 1
         
-        # 1. Set ssthresh = cwnd / 2
+        # Transition to Congestion Avoidance when cwnd >= ssthresh
+        if self.cwnd >= self.ssthresh:
+            self.state = RenoState.CONGESTION_AVOIDANCE
+            log.debug("[RENO-%s] 🚦 SLOW_START → CONGESTION_AVOIDANCE (cwnd=%.1f)", self.username, self.cwnd)
+    
+    def _ack_congestion_avoidance(self):
+        """Congestion Avoidance: cwnd += 1/cwnd for each ACK (linear growth)"""
+        self.cwnd += 1.0 / self.cwnd
+    
+    def _ack_fast_recovery(self):
+        """Fast Recovery: exit when new ACK received"""
+        self.cwnd = self.ssthresh
+        self.state = RenoState.CONGESTION_AVOIDANCE
+        log.debug("[RENO-%s] 🏃 FAST_RECOVERY → CONGESTION_AVOIDANCE (cwnd=%.1f)", self.username, self.cwnd)
+    
+    def _apply_congestion_event(self, kind):
+        """Handle a loss event: kind is "fast_retransmit" (enter Fast Recovery) or "timeout" (back to Slow Start)"""
+        # Both events halve the window into ssthresh and retransmit the lost packet
         self.ssthresh = max(self.cwnd / 2, 2)
-        
-        # 2. Set cwnd = 1 (back to slow start)
-        self.cwnd = 1
-        
-        # 3. Enter Slow Start state
-        self.state = "SLOW_START"
-        
-        # 4. Reset duplicate ACK counter
-        self.duplicate_acks = 0
-        
-        # 5. Update statistics
-        self.timeouts += 1
         self.retransmissions += 1
         
-        print(f"[RENO-{self.username}] 📉 SSTHRESH: {self.ssthresh:.1f}")
-        print(f"[RENO-{self.username}] 📊 CWND: 1.0 (reset)")
-        print(f"[RENO-{self.username}] 🐌 STATE: SLOW_START")
-        print(f"[RENO-{self.username}] 🔄 Retransmitting from beginning")
+        if kind == "timeout":
+            # Severe congestion: cwnd = 1, restart Slow Start
+            self.cwnd = 1
+            self.state = RenoState.SLOW_START
+            self.duplicate_acks = 0
+            self.timeouts += 1
+        else:
+            # cwnd = ssthresh + 3 for the 3 duplicate ACKs, then Fast Recovery
+            self.cwnd = self.ssthresh + 3
+            self.state = RenoState.FAST_RECOVERY
+            self.fast_retransmits += 1
+        
+        log.debug("[RENO-%s] %s → SSTHRESH: %.1f, CWND: %.1f, STATE: %s, 🔄 Retransmitting",
+                  self.username, kind.upper(), self.ssthresh, self.cwnd, self.state.name)
         
-        # Record timeout event for graph
-        record_cwnd_point(self.cwnd, self.ssthresh, self.state, "timeout")
+        self._record_point(kind)
     
-    def _simulate_packet_loss(self):
-        """Simulate packet loss based on current network conditions"""
-        return random.random() < self.current_loss_rate
+    def _record_point(self, event_type=None):
+        """Send the current window to the graph and reset the recording throttle"""
+        self._last_recorded_cwnd = self.cwnd
+        self._acks_since_record = 0
+        record_cwnd_point(self.cwnd, self.ssthresh, self.state.name, event_type, username=self.username)
     
     def _adjust_network_conditions(self, data_size):
         """Adjust network conditions based on data size"""
-        if data_size > 2000:  # Large files
-            self.current_loss_rate = 0.12  # 12% loss rate
-            congestion_level = "SEVERE"
-        elif data_size > 1000:
-            self.current_loss_rate = 0.08  # 8% loss rate
-            congestion_level = "HIGH"
-        elif data_size > 500:
-            self.current_loss_rate = 0.05  # 5% loss rate
-            congestion_level = "MEDIUM"
-        else:
-            self.current_loss_rate = 0.02  # 2% loss rate
-            congestion_level = "LOW"
+        self.current_loss_rate, congestion_level = LOSS_LEVELS[bisect.bisect_left(LOSS_THRESHOLDS, data_size)]
         
         print(f"[RENO-{self.username}] 🌐 Network Congestion: {congestion_level} (Loss: {self.current_loss_rate*100:.0f}%)")
     
@@ -242,7 +279,7 @@ class TCPRenoController:
         return {
             'cwnd': self.cwnd,
             'ssthresh': self.ssthresh,
-            'state': self.state,
+            'state': self.state.name,
             'packets_sent': self.packets_sent,
             'retransmissions': self.retransmissions,
             'fast_retransmits': self.fast_retransmits,
@@ -252,6 +289,10 @@ class TCPRenoController:
             'algorithm': 'TCP Reno'
         }
     
+    def set_seed(self, seed):
+        """Restart the simulated network's random stream from seed"""
+        self._rng = np.random.default_rng(seed)
+    
     def reset_stats(self):
         """Reset statistics counters"""
         self.packets_sent = 0
@@ -263,25 +304,24 @@ class TCPRenoController:
 # Global TCP Reno controller
 reno_controller = None
 
-def initialize_reno(username):
-    """Initialize TCP Reno controller"""
+def initialize_reno(username, seed=None):
+    """Initialize TCP Reno controller; pass a seed to replay the same simulated network"""
     global reno_controller
-    reno_controller = TCPRenoController(username)
+    reno_controller = TCPRenoController(username, seed)
     
     # Initialize graph recording if available
     if GRAPH_AVAILABLE:
-        from tcp_reno_graph import get_grapher
-        grapher = get_grapher(username)
+        get_grapher(username)
         print(f"[RENO] 📊 Graph recording initialized for {username}")
     
     print(f"[RENO] 🚀 TCP Reno algorithm initialized for {username}")
 
 def simulate_reno_transmission(data, data_type="message"):
     """Simulate TCP Reno transmission"""
-    global reno_controller
-    if reno_controller is None:
+    if not __debug__:
         return True
-    return reno_controller.simulate_reno_transmission(data, data_type)
+    ctl = reno_controller
+    return True if ctl is None or not ctl.enabled else ctl.simulate_reno_transmission(data, data_type)
 
 def get_reno_stats():
     """Get TCP Reno statistics"""
@@ -311,14 +351,17 @@ def reset_reno_stats():
         return True
     return False
 
+def _graph_username():
+    """User whose grapher the graph helpers operate on"""
+    return reno_controller.username if reno_controller else "User"
+
 def show_reno_graph(master_window=None):
     """Show TCP Reno CWND graph"""
     if GRAPH_AVAILABLE:
-        from tcp_reno_graph import get_grapher, show_graph
         # Initialize grapher for current user if needed
-        username = reno_controller.username if reno_controller else "User"
-        grapher = get_grapher(username)
-        return show_graph(master_window)
+        username = _graph_username()
+        get_grapher(username)
+        return show_graph(master_window, username)
     else:
         print("[RENO] Graphing module not available")
         return None
@@ -326,22 +369,19 @@ def show_reno_graph(master_window=None):
 def start_graph_recording():
     """Start recording data for graph"""
     if GRAPH_AVAILABLE:
-        from tcp_reno_graph import start_graph_recording as start_recording
-        start_recording()
+        _start_recording(_graph_username())
         return True
     return False
 
 def stop_graph_recording():
     """Stop recording data for graph"""
     if GRAPH_AVAILABLE:
-        from tcp_reno_graph import stop_graph_recording as stop_recording
-        stop_recording()
+        _stop_recording(_graph_username())
         return True
     return False
 
 def save_reno_graph(file_path=None):
-    """Save current graph as image"""
+    """Save current graph as image off the GUI thread; returns a Future for the saved path"""
     if GRAPH_AVAILABLE:
-        from tcp_reno_graph import save_graph
-        return save_graph(file_path)
+        return save_graph(file_path, _graph_username())
     return None